@@ -1,21 +1,44 @@
 from django.contrib import admin
 from .models import Author, Book, BorrowRecord
+from .paginators import EstimatedCountPaginator
+
+# changelists are tuned for large tables: joined FK loading, autocomplete widgets
+# instead of full dropdowns, estimated counts and indexed date hierarchies
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
     list_display = ['name']
-    search_fields = ['name']
+    search_fields = ['name']  # also backs the author autocomplete on BookAdmin
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'ISBN', 'category', 'availability_status']
-    list_filter = ['availability_status', 'category', 'author']
+    list_display = ['title', 'author', 'ISBN', 'category', 'branch', 'availability_status']
+    list_filter = ['branch', 'availability_status', 'category']  # no author filter, it rendered every Author
     search_fields = ['title', 'ISBN']
+    list_select_related = ['author', 'branch']
+    autocomplete_fields = ['author']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 # removed MemberAdmin, now in CustomUser
 
 @admin.register(BorrowRecord)
 class BorrowRecordAdmin(admin.ModelAdmin):
     list_display = ['book', 'member', 'borrow_date', 'return_date']
-    list_filter = ['borrow_date', 'return_date']
+    list_filter = ['branch', 'return_date']
+    list_select_related = ['book', 'member']
+    autocomplete_fields = ['book', 'member']
+    date_hierarchy = 'borrow_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
+    def save_model(self, request, obj, form, change):
+        # the change view runs in a transaction; deletes are counted by the post_delete signal
+        previous = None
+        if change:
+            saved = BorrowRecord.objects.filter(pk=obj.pk).values_list('member_id', 'return_date').first()
+            previous = (saved[0], saved[1] is None) if saved else None
+        super().save_model(request, obj, form, change)
+        obj.adjust_open_loans(previous)
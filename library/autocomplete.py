@@ -0,0 +1,199 @@
+# library/autocomplete.py
+import datetime
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text):
+    return ' '.join(str(text).casefold().split())
+
+
+class PrefixIndex:
+    """
+    In-process, memory compact prefix index for typeahead.
+    Every label is stored once, and a sorted list of (key, id) pairs holds one
+    key per word start, so 'pott' matches 'Harry Potter'. Lookups are a
+    bisect plus a short forward scan. Each entry may carry a group (the book's
+    branch) so one index serves every branch.
+    Writes from this process are applied by signals; writes from other workers
+    are picked up from the SyncChange feed of `sync_model`, checked at most
+    every AUTOCOMPLETE_SYNC_SECONDS.
+    """
+    KEY_LENGTH = 48  # keys are truncated, prefixes longer than this are matched on the truncated key
+    SYNC_BATCH = 1000  # more pending changes than this and the index is rebuilt instead
+
+    def __init__(self, load, max_entries, sync_model=None):
+        self._load = load  # callable returning (id, label, group) rows, all of them or only `ids`
+        self._max_entries = max_entries
+        self._sync_model = sync_model
+        self._keys = []
+        self._labels = {}
+        self._groups = {}
+        self._version = 0  # SyncChange id the index is known to be current with
+        self._next_sync = 0
+        self._warm = False
+        self._lock = threading.Lock()
+
+    def _keys_for(self, label):
+        words = _normalize(label).split(' ')
+        return {' '.join(words[i:])[:self.KEY_LENGTH] for i in range(len(words))}
+
+    def warm(self):
+        with self._lock:
+            if self._warm:
+                return
+            # read the version first, changes committed while loading are replayed by sync()
+            version = self._latest_change()
+            keys = []
+            labels = {}
+            groups = {}
+            dropped = 0
+            for pk, label, group in self._load():
+                label_keys = self._keys_for(label)
+                if len(keys) + len(label_keys) > self._max_entries:
+                    dropped += 1
+                    continue
+                labels[pk] = label
+                groups[pk] = group
+                keys.extend((key, pk) for key in label_keys)
+            if dropped:
+                logger.warning(
+                    '%s autocomplete index is full at %d entries, %d labels left out; raise AUTOCOMPLETE_MAX_ENTRIES',
+                    self._sync_model or 'prefix', self._max_entries, dropped,
+                )
+            keys.sort()
+            self._keys = keys
+            self._labels = labels
+            self._groups = groups
+            self._version = version
+            self._next_sync = time.monotonic() + getattr(settings, 'AUTOCOMPLETE_SYNC_SECONDS', 5)
+            self._warm = True
+
+    def _latest_change(self):
+        if self._sync_model is None:
+            return 0
+        from .models import SyncChange
+        return SyncChange.objects.filter(model=self._sync_model).order_by('-id').values_list('id', flat=True).first() or 0
+
+    def sync(self):
+        """
+        Apply catalog changes made by other workers since the index was built.
+        Cheap when nothing changed: one indexed lookup on the change feed, at
+        most every AUTOCOMPLETE_SYNC_SECONDS.
+        """
+        if self._sync_model is None or not self._warm or time.monotonic() < self._next_sync:
+            return
+        from .models import SyncChange
+        self._next_sync = time.monotonic() + getattr(settings, 'AUTOCOMPLETE_SYNC_SECONDS', 5)
+        changes = list(
+            SyncChange.objects.filter(model=self._sync_model, id__gt=self._version)
+            .order_by('id').values_list('id', 'object_id', 'deleted', 'changed_at')[:self.SYNC_BATCH + 1]
+        )
+        if not changes:
+            return
+        if len(changes) > self.SYNC_BATCH:
+            self.reset()
+            self.warm()
+            return
+        rows = {pk: (label, group) for pk, label, group in self._load([row[1] for row in changes if not row[2]])}
+        # a change committed late can carry a lower id than one already seen, so the
+        # version only moves past changes older than the sync feed's safety lag
+        horizon = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'SYNC_SAFETY_LAG_SECONDS', 5))
+        settled = next((i for i, row in enumerate(changes) if row[3] > horizon), len(changes))
+        for _, pk, deleted, _ in changes:
+            if pk in rows:
+                self.update(pk, *rows[pk])
+            else:
+                self.remove(pk)  # deleted, or hidden while pending deletion
+        with self._lock:
+            if settled:
+                self._version = max(self._version, changes[settled - 1][0])
+
+    def reset(self):
+        with self._lock:
+            self._keys = []
+            self._labels = {}
+            self._groups = {}
+            self._warm = False
+
+    def _remove(self, pk):
+        label = self._labels.pop(pk, None)
+        self._groups.pop(pk, None)
+        if label is None:
+            return
+        for key in self._keys_for(label):
+            i = bisect_left(self._keys, (key, pk))
+            if i < len(self._keys) and self._keys[i] == (key, pk):
+                del self._keys[i]
+
+    def update(self, pk, label, group=None):
+        with self._lock:
+            if not self._warm:
+                return  # picked up by the first warm()
+            self._remove(pk)
+            label_keys = self._keys_for(label)
+            if len(self._keys) + len(label_keys) > self._max_entries:
+                logger.warning('%s autocomplete index is full, %r left out', self._sync_model or 'prefix', label)
+                return
+            self._labels[pk] = label
+            self._groups[pk] = group
+            for key in label_keys:
+                insort(self._keys, (key, pk))
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def search(self, prefix, limit=10, group=None):
+        """
+        Labels whose words start with `prefix`, only entries of `group` when given.
+        """
+        self.warm()
+        self.sync()
+        prefix = _normalize(prefix)[:self.KEY_LENGTH]
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        keys = self._keys
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and len(results) < limit:
+            key, pk = keys[i]
+            if not key.startswith(prefix):
+                break
+            if pk not in seen and (group is None or self._groups.get(pk) == group):
+                seen.add(pk)
+                label = self._labels.get(pk)
+                if label is not None:
+                    results.append({'id': pk, 'label': label})
+            i += 1
+        return results
+
+
+def _load_titles(ids=None):
+    from .models import Book
+    # hidden rows stay out in every worker, not just the one that scheduled the deletion
+    books = Book.objects.filter(pending_deletion=False)
+    if ids is not None:
+        books = books.filter(id__in=ids)
+    return books.values_list('id', 'title', 'branch_id').iterator(chunk_size=2000)
+
+
+def _load_author_names(ids=None):
+    from .models import Author
+    authors = Author.objects.filter(pending_deletion=False)
+    if ids is not None:
+        authors = authors.filter(id__in=ids)
+    return ((pk, name, None) for pk, name in authors.values_list('id', 'name').iterator(chunk_size=2000))
+
+
+_max_entries = getattr(settings, 'AUTOCOMPLETE_MAX_ENTRIES', 500000)
+book_titles = PrefixIndex(_load_titles, _max_entries, sync_model='book')
+author_names = PrefixIndex(_load_author_names, _max_entries, sync_model='author')
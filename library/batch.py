@@ -0,0 +1,101 @@
+# library/batch.py
+# runs the GET sub-requests of one /batch/ call in-process, see views.batch
+import functools
+import json
+from urllib.parse import urlsplit
+
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.response import Response
+
+# conditional headers a sub-request may carry, so batched reads still get 304s
+FORWARDED_HEADERS = {'If-None-Match': 'HTTP_IF_NONE_MATCH', 'If-Modified-Since': 'HTTP_IF_MODIFIED_SINCE'}
+RETURNED_HEADERS = ['ETag', 'Last-Modified']
+
+
+class OuterRequestAuthentication(BaseAuthentication):
+    """
+    Authenticates a SubRequest as the user of the batch call it belongs to,
+    whose credentials were already checked, instead of decoding the JWT again.
+    Other requests fall through to the view's own authenticators.
+    """
+    def authenticate(self, request):
+        return getattr(request._request, 'outer_auth', None)
+
+
+class SubRequest(HttpRequest):
+    """
+    A GET built from one batch entry. It reuses the outer request's META (host,
+    scheme, client address) and carries its user and auth for OuterRequestAuthentication.
+    """
+    def __init__(self, outer, path, query, headers):
+        super().__init__()
+        self.method = 'GET'
+        self.path = self.path_info = path
+        self.META = {
+            key: value for key, value in outer.META.items()
+            if key not in ('CONTENT_LENGTH', 'CONTENT_TYPE') and key not in FORWARDED_HEADERS.values()
+        }
+        self.META.update(REQUEST_METHOD='GET', PATH_INFO=path, QUERY_STRING=query)
+        for name, meta_key in FORWARDED_HEADERS.items():
+            if headers.get(name):
+                self.META[meta_key] = headers[name]
+        self.GET = QueryDict(query)
+        self.COOKIES = outer.COOKIES
+        self._scheme = outer.scheme
+        self.user = outer.user
+        self.outer_auth = (outer.user, outer.auth)
+
+    def _get_scheme(self):
+        return self._scheme
+
+
+@functools.cache
+def _batchable(view):
+    """
+    The same DRF view with OuterRequestAuthentication in front of its authenticators,
+    built once per view.
+    """
+    authentication_classes = [OuterRequestAuthentication, *view.cls.authentication_classes]
+    if getattr(view, 'actions', None) is not None:  # router generated viewset view
+        return view.cls.as_view(view.actions, **view.initkwargs, authentication_classes=authentication_classes)
+    return view.cls.as_view(**view.initkwargs, authentication_classes=authentication_classes)
+
+
+def _error(status, message):
+    return {'status': status, 'headers': {}, 'body': {'error': message}}
+
+
+def _body(response):
+    if isinstance(response, Response):
+        return response.data  # rendered once, as part of the batch response
+    if response.get('Content-Type', '').startswith('application/json') and response.content:
+        return json.loads(response.content)
+    return response.content.decode(response.charset, errors='replace') or None
+
+
+def dispatch(request, entry):
+    """
+    Resolve and run one `{"url": ..., "headers": {...}}` entry, returning
+    `{"status", "headers", "body"}`. Only DRF views can be batched.
+    """
+    url = urlsplit(entry['url'])
+    if url.scheme or url.netloc or not url.path.startswith('/'):
+        return _error(400, 'url must be a path relative to this API, e.g. /books/?page=2')
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return _error(404, 'Not found')
+    view = match.func
+    if not hasattr(view, 'cls'):
+        return _error(400, 'This endpoint cannot be batched')  # admin, the SSE stream
+
+    sub_request = SubRequest(request, url.path, url.query, entry.get('headers') or {})
+    sub_request.resolver_match = match
+    response = _batchable(view)(sub_request, *match.args, **match.kwargs)
+    return {
+        'status': response.status_code,
+        'headers': {name: response[name] for name in RETURNED_HEADERS if response.has_header(name)},
+        'body': _body(response),
+    }
@@ -0,0 +1,65 @@
+# library/conditional.py
+# ETag / Last-Modified validators for catalog and borrow-record reads
+import hashlib
+import time
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from users.models import get_user_branch_id, get_user_role
+from .models import SyncChange
+
+
+class ConditionalReadMixin:
+    """
+    Adds ETag and Last-Modified to list and retrieve responses, and answers
+    If-None-Match / If-Modified-Since with 304 before the queryset is read or
+    serialized.
+    The table version is the newest SyncChange sequence of `sync_model`: every
+    save, delete, deletion-job tombstone and archive batch bumps it, and it
+    costs one index only query. Role and branch are hashed into the ETag, so a validator from
+    one scope never matches a response rendered for another. Last-Modified is
+    left out while the newest change is in the current second.
+    """
+    sync_model = None  # SyncChange.model value, 'author', 'book' or 'borrowrecord'
+
+    def etag_scope(self):
+        user = self.request.user
+        return [get_user_role(user), get_user_branch_id(user)]
+
+    def validators(self):
+        version = (
+            SyncChange.objects.filter(model=self.sync_model)
+            .order_by('-id').values_list('id', 'changed_at').first()
+        )
+        sequence, changed_at = version or (0, None)
+        key = [
+            self.sync_model, sequence, self.request.get_full_path(),
+            self.request.accepted_renderer.format, *self.etag_scope(),
+        ]
+        etag = '"%s"' % hashlib.md5(repr(key).encode(), usedforsecurity=False).hexdigest()
+        last_modified = int(changed_at.timestamp()) if changed_at else None  # HTTP dates have second precision
+        if last_modified is not None and last_modified >= int(time.time()):
+            # another write may still land in this second without moving the date, the ETag alone validates
+            last_modified = None
+        return etag, last_modified
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.validators()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # always revalidate, and never share a response between users
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
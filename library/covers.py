@@ -0,0 +1,119 @@
+# library/covers.py
+# book cover uploads: content hashed originals, thumbnails rendered in a background process pool
+import functools
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _digest(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+
+def cover_upload_to(instance, filename):
+    """
+    covers/<content hash>.<ext>: a new cover always gets a new url, so every
+    cover url can be cached forever.
+    """
+    file = instance.cover.file
+    name = _digest(file.chunks())
+    file.seek(0)
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    return f'covers/{name}{extension}'
+
+
+def render_thumbnails(path, sizes):
+    """
+    Runs in a pool worker, needs only Pillow and the file path.
+    Returns {variant: webp bytes}, each at most `width` wide, aspect ratio kept.
+    """
+    from PIL import Image, ImageOps
+
+    rendered = {}
+    with Image.open(path) as image:
+        widest = max(sizes.values())
+        image.draft('RGB', (widest, widest * 2))  # JPEGs decode straight at a reduced scale
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        for variant, width in sizes.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((width, width * 2))  # covers are portrait, the width is what matters
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, 'WEBP', quality=80)
+            rendered[variant] = buffer.getvalue()
+    return rendered
+
+
+def store_thumbnails(book_id, source, rendered):
+    """
+    Save rendered variants under content hashed names and attach them to the
+    book, unless its cover was replaced while they were being rendered.
+    """
+    from .models import Book
+
+    thumbnails = {'source': source}
+    for variant, data in rendered.items():
+        name = f'covers/thumbs/{_digest([data])}_{variant}.webp'
+        if not default_storage.exists(name):  # same name, same bytes
+            default_storage.save(name, ContentFile(data))
+        thumbnails[variant] = name
+    book = Book.objects.filter(pk=book_id, cover=source).first()
+    if book is not None:
+        book.cover_thumbnails = thumbnails
+        book.save(update_fields=['cover_thumbnails', 'updated_at'])  # signals bump the ETag/sync version
+
+
+def _pool_executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'COVER_THUMBNAIL_WORKERS', 2))
+        return _pool
+
+
+def _rendered(book_id, source, future):
+    # runs on the executor's result thread, which gets its own db connection
+    try:
+        store_thumbnails(book_id, source, future.result())
+    finally:
+        connection.close()
+
+
+def schedule(book):
+    """
+    Render the book's thumbnails off the request; called on commit after a new
+    cover is saved. With COVER_THUMBNAIL_WORKERS = 0 they're rendered inline.
+    Failures leave the thumbnails empty, `manage.py cover_thumbnails` retries them.
+    """
+    source = book.cover.name
+    path = default_storage.path(source)
+    sizes = getattr(settings, 'COVER_THUMBNAIL_SIZES', {'small': 160, 'medium': 320})
+    if not getattr(settings, 'COVER_THUMBNAIL_WORKERS', 2):
+        store_thumbnails(book.pk, source, render_thumbnails(path, sizes))
+        return
+    future = _pool_executor().submit(render_thumbnails, path, sizes)
+    future.add_done_callback(functools.partial(_rendered, book.pk, source))
+
+
+def thumbnail_urls(book, request=None):
+    urls = {}
+    for variant, name in (book.cover_thumbnails or {}).items():
+        if variant == 'source':
+            continue
+        url = default_storage.url(name)
+        urls[variant] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,106 @@
+# library/deletion.py
+# background cascade deletion for Authors and Books, see DeletionJob
+from django.db import models, transaction
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+
+from . import autocomplete
+from users.models import CustomUser, get_user_branch_id
+
+from .models import Author, Book, BorrowRecord, DeletionJob, SyncChange
+
+
+def _tombstones(model_name, ids, members=None, branches=None):
+    # members: {borrow record id: member id}, members' feeds only carry their own loans
+    # branches: {id: branch id}, branch scoped feeds only carry their branch's rows
+    members = members or {}
+    branches = branches or {}
+    SyncChange.objects.filter(model=model_name, object_id__in=ids).delete()
+    SyncChange.objects.bulk_create([
+        SyncChange(model=model_name, object_id=pk, deleted=True, member_id=members.get(pk), branch_id=branches.get(pk))
+        for pk in ids
+    ])
+
+
+def schedule(instance, user=None):
+    """
+    Hide `instance` (and an author's books) right away and queue the actual delete.
+    """
+    model_name = instance._meta.model_name
+    with transaction.atomic():
+        type(instance).objects.filter(pk=instance.pk).update(pending_deletion=True)
+        _tombstones(model_name, [instance.pk], branches={instance.pk: getattr(instance, 'branch_id', None)})
+        book_ids = [instance.pk] if isinstance(instance, Book) else []
+        if isinstance(instance, Author):
+            books = Book.objects.filter(author=instance)
+            branches = dict(books.values_list('id', 'branch_id'))
+            book_ids = list(branches)
+            books.update(pending_deletion=True)
+            _tombstones('book', book_ids, branches=branches)
+            transaction.on_commit(lambda: autocomplete.author_names.remove(instance.pk))
+        # book jobs belong to the book's branch, author jobs (authors span branches) to the requester's
+        if isinstance(instance, Book):
+            branch_id = instance.branch_id
+        else:
+            branch_id = get_user_branch_id(user) if user is not None else None
+        job = DeletionJob.objects.create(model=model_name, object_id=instance.pk, requested_by=user, branch_id=branch_id)
+        transaction.on_commit(lambda: [autocomplete.book_titles.remove(pk) for pk in book_ids])
+    return job
+
+
+def _purge(model, pks, job, batch_size):
+    """
+    Delete `pks` of `model` after everything that cascades to them, depth first,
+    `batch_size` rows per DELETE. Raw deletes skip the collector and signals, so
+    nothing is loaded into memory. Safe to rerun after a crash.
+    """
+    # same relation discovery as django's Collector, including related_name='+' reverse relations
+    for relation in get_candidate_relations_to_delete(model._meta):
+        if relation.on_delete is not models.CASCADE:
+            continue
+        child = relation.related_model
+        children = child._base_manager.filter(**{f'{relation.field.name}__in': pks}).order_by('pk')
+        while True:
+            ids = list(children.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            _purge(child, ids, job, batch_size)
+    with transaction.atomic():
+        if model is BorrowRecord:
+            owners = BorrowRecord.objects.filter(pk__in=pks).values_list('pk', 'member_id', 'branch_id')
+            members = {pk: member_id for pk, member_id, _ in owners}
+            branches = {pk: branch_id for pk, _, branch_id in owners}
+            _tombstones('borrowrecord', pks, members, branches)  # raw deletes send no post_delete
+            open_loans = (
+                BorrowRecord.objects.filter(pk__in=pks, return_date__isnull=True)
+                .order_by().values('member_id').annotate(n=models.Count('id'))
+            )
+            for row in open_loans:
+                CustomUser.adjust_open_loans(row['member_id'], -row['n'])
+        deleted = model._base_manager.filter(pk__in=pks)._raw_delete(model._base_manager.db)
+    if deleted:
+        DeletionJob.objects.filter(pk=job.pk).update(deleted_rows=models.F('deleted_rows') + deleted)
+
+
+def claim_next():
+    with transaction.atomic():
+        job = (
+            DeletionJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending').order_by('id').first()
+        )
+        if job is not None:
+            job.status = 'running'
+            job.save(update_fields=['status'])
+    return job
+
+
+def run(job, batch_size=1000):
+    model = {'author': Author, 'book': Book}[job.model]
+    try:
+        _purge(model, [job.object_id], job, batch_size)
+    except Exception as e:
+        DeletionJob.objects.filter(pk=job.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        raise
+    DeletionJob.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
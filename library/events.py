@@ -0,0 +1,81 @@
+# library/events.py
+import asyncio
+import threading
+
+
+class Subscription:
+    """
+    One connected client. Events are handed to its event loop with
+    call_soon_threadsafe, so publishers in sync views never block on a slow
+    reader; when the queue is full the oldest event is dropped.
+    """
+    def __init__(self, loop, books=None, categories=None, max_queue=100, branch=None):
+        self.loop = loop
+        self.branch = branch  # None receives every branch
+        self.books = books or set()
+        self.categories = categories or set()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def matches(self, event):
+        if self.branch is not None and event.get('branch') != self.branch:
+            return False
+        if not self.books and not self.categories:
+            return True
+        return event.get('book') in self.books or event.get('category') in self.categories
+
+    def _offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            pass  # loop already closed, the stream is being torn down
+
+
+class Broadcaster:
+    """
+    In-process fan out of availability changes to SSE subscribers.
+    Only reaches clients connected to the same worker process.
+    """
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, books=None, categories=None, max_queue=100, branch=None):
+        subscription = Subscription(asyncio.get_running_loop(), books, categories, max_queue, branch)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.matches(event):
+                subscription.deliver(event)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+availability = Broadcaster()
+
+
+def publish_availability(book, event_type):
+    """
+    Called through transaction.on_commit so clients never see rolled back changes.
+    """
+    availability.publish({
+        'type': event_type,
+        'book': book.pk,
+        'category': book.category,
+        'branch': book.branch_id,
+        'available': book.availability_status,
+    })
@@ -0,0 +1,58 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from library.models import ArchivedBorrowRecord, BorrowRecord, SyncChange
+
+
+class Command(BaseCommand):
+    help = "Move returned BorrowRecords older than the cutoff into ArchivedBorrowRecord, in id ordered batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            default=getattr(settings, 'BORROW_ARCHIVE_AFTER_DAYS', 365),
+            help="Archive loans returned more than this many days ago",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the rows that would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now().date() - datetime.timedelta(days=options['older_than_days'])
+        candidates = BorrowRecord.objects.filter(return_date__isnull=False, return_date__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f"{candidates.count()} records returned before {cutoff} would be archived.")
+            return
+
+        archived = 0
+        last_id = 0
+        while True:
+            # keyset pagination on the primary key, each batch is one short transaction
+            batch = list(
+                candidates.filter(id__gt=last_id)
+                .order_by('id')
+                .values('id', 'book_id', 'member_id', 'branch_id', 'borrow_date', 'return_date')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            ids = [row['id'] for row in batch]
+            with transaction.atomic():
+                ArchivedBorrowRecord.objects.bulk_create(
+                    [ArchivedBorrowRecord(**row) for row in batch],
+                    ignore_conflicts=True,  # rerun after a crash between insert and delete
+                )
+                # moved, not deleted: a raw delete sends no post_delete, so no sync tombstones,
+                # and skips the collector (nothing references BorrowRecord)
+                BorrowRecord.objects.filter(id__in=ids)._raw_delete(BorrowRecord.objects.db)
+                # their change feed entries go too, and the marker moves the borrow record
+                # version so conditional reads of /borrow-records/ don't answer a stale 304
+                SyncChange.objects.filter(model='borrowrecord', object_id__in=ids).delete()
+                SyncChange.bump('borrowrecord')
+            archived += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Archived {archived} records (up to id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {archived} records returned before {cutoff} archived."))
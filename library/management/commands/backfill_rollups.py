@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from library import rollups
+from library.models import ArchivedBorrowRecord, BorrowRecord
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily circulation rollups from borrow history, in chunks of days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day (YYYY-MM-DD), default the oldest loan")
+        parser.add_argument('--end', help="Last day (YYYY-MM-DD), default today")
+        parser.add_argument('--chunk-days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.date.fromisoformat(options['start']) if options['start'] else None
+            end = datetime.date.fromisoformat(options['end']) if options['end'] else timezone.now().date()
+        except ValueError:
+            raise CommandError("--start/--end must be YYYY-MM-DD dates")
+        if start is None:
+            oldest = [
+                model.objects.aggregate(first=Min('borrow_date'))['first']
+                for model in (BorrowRecord, ArchivedBorrowRecord)
+            ]
+            oldest = [day for day in oldest if day]
+            if not oldest:
+                self.stdout.write("No borrow history, nothing to do.")
+                return
+            start = min(oldest)
+
+        for chunk_start, chunk_end, loans in rollups.backfill(start, end, options['chunk_days']):
+            self.stdout.write(f"{chunk_start} .. {chunk_end - datetime.timedelta(days=1)}: {loans} loans")
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt."))
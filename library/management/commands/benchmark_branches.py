@@ -0,0 +1,97 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from library.models import Author, Book, BorrowRecord
+from users.models import Branch, CustomUser
+
+ENDPOINTS = ['/books/', '/borrow-records/', '/users/']
+
+
+def seed(branches, rows):
+    """
+    `branches` branches with `rows` books, members and loans each. Returns the
+    librarian of the first branch, whose requests are timed.
+    """
+    author = Author.objects.create(name='Benchmark author', biography='-')
+    librarian = None
+    for b in range(branches):
+        branch = Branch.objects.create(name=f'Branch {b}', code=f'b{b}')
+        if librarian is None:
+            librarian = CustomUser.objects.create(
+                username='bench_librarian', email='librarian@bench.test', role='librarian', branch=branch,
+            )
+        members = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench_{b}_{i}', email=f'{b}_{i}@bench.test', role='member', branch=branch)
+            for i in range(rows)
+        ])
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {b}-{i}', author=author, ISBN=f'{b:03d}{i:010d}', category='bench', branch=branch)
+            for i in range(rows)
+        ])
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(book=book, member=member, branch=branch) for book, member in zip(books, members)
+        ])
+    return librarian
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a test database with a growing number of branches and time one branch's "
+        "list endpoints, to check per-branch latency stays flat as branches are added."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branches', default='1,4,16', help="Comma separated branch counts to compare")
+        parser.add_argument('--rows', type=int, default=500, help="Books, members and loans per branch")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed requests per endpoint")
+
+    def handle(self, *args, **options):
+        try:
+            counts = sorted(int(count) for count in options['branches'].split(','))
+        except ValueError:
+            raise CommandError("--branches must be a comma separated list of integers")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = {}
+            for count in counts:
+                with transaction.atomic():
+                    librarian = seed(count, options['rows'])
+                    client = APIClient()
+                    client.force_authenticate(librarian)
+                    for url in ENDPOINTS:
+                        results[count, url] = self.time(client, url, options['repeat'])
+                    if count == counts[-1]:
+                        plan = Book.objects.filter(branch=librarian.branch_id, pending_deletion=False)[:10].explain()
+                    transaction.set_rollback(True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{options['rows']} rows per branch, median of {options['repeat']} requests")
+        self.stdout.write(f"{'endpoint':<20}" + ''.join(f"{f'{count} branches':>16}" for count in counts))
+        for url in ENDPOINTS:
+            cells = ''.join(f"{f'{results[count, url][0]:.1f}ms {results[count, url][1]}q':>16}" for count in counts)
+            self.stdout.write(f"{url:<20}{cells}")
+        self.stdout.write(f"\nBook list plan with {counts[-1]} branches:\n{plan}")
+
+    def time(self, client, url, repeat):
+        cache.clear()  # throttle counters
+        client.get(url)  # warm up
+        timings = []
+        for _ in range(repeat):
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url} returned {response.status_code}")
+        return statistics.median(timings), len(captured)
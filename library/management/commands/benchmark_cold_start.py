@@ -0,0 +1,69 @@
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# boots the app and serves one unauthenticated API request (401 before any query) in a fresh interpreter
+PROBE = """
+import time
+started = time.perf_counter()
+from library_management.wsgi import app
+booted = time.perf_counter()
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()  # allows the 'testserver' host
+status = Client().get('/books/').status_code
+done = time.perf_counter()
+print(status, (booted - started) * 1000, (done - booted) * 1000)
+"""
+
+PROFILES = {
+    'full': {'ENABLE_ADMIN': 'True', 'ENABLE_API_DOCS': 'True', 'WARM_UP_ON_START': 'False'},
+    'lean, no warm-up': {'ENABLE_ADMIN': 'False', 'ENABLE_API_DOCS': 'False', 'WARM_UP_ON_START': 'False'},
+    'lean': {'ENABLE_ADMIN': 'False', 'ENABLE_API_DOCS': 'False', 'WARM_UP_ON_START': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = "Spawn fresh interpreters to time boot plus first request for the full and the lean app profiles."
+    # warm-up doesn't shorten a cold start, it moves the resolver/serializer work from the first
+    # request into boot, which serverless platforms run before the worker takes traffic
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=10, help="Cold starts per profile")
+
+    def run_probe(self, overrides):
+        env = dict(os.environ, **overrides)
+        result = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(f"cold start failed:\n{result.stderr[-2000:]}")
+        status, boot, first = result.stdout.split()[-3:]
+        return int(status), float(boot), float(first)
+
+    def handle(self, *args, **options):
+        timings = {name: {'boot': [], 'first': [], 'total': []} for name in PROFILES}
+        for _ in range(options['repeat']):
+            # interleaved, so drift in machine load hits both profiles alike
+            for name, overrides in PROFILES.items():
+                status, boot, first = self.run_probe(overrides)
+                if status != 401:
+                    raise CommandError(f"{name}: GET /books/ returned {status}, expected 401")
+                timings[name]['boot'].append(boot)
+                timings[name]['first'].append(first)
+                timings[name]['total'].append(boot + first)
+
+        self.stdout.write(f"{options['repeat']} cold starts per profile, medians")
+        medians = {name: {key: statistics.median(values) for key, values in runs.items()} for name, runs in timings.items()}
+        for name, median in medians.items():
+            self.stdout.write(
+                f"{name:<16} boot {median['boot']:7.1f}ms  first request {median['first']:6.1f}ms  total {median['total']:7.1f}ms"
+            )
+        full = medians['full']
+        for name, median in medians.items():
+            if name != 'full':
+                self.stdout.write(
+                    f"{name} vs full: first request {median['first'] - full['first']:+.1f}ms, "
+                    f"cold start {median['total'] - full['total']:+.1f}ms"
+                )
@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import CustomUser
+
+# the stock django arrangement the lean classes replace
+STOCK = {
+    'library_management.middleware.LeanSessionMiddleware': 'django.contrib.sessions.middleware.SessionMiddleware',
+    'library_management.middleware.LeanCsrfViewMiddleware': 'django.middleware.csrf.CsrfViewMiddleware',
+    'library_management.middleware.LeanAuthenticationMiddleware': 'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'library_management.middleware.LeanMessageMiddleware': 'django.contrib.messages.middleware.MessageMiddleware',
+}
+
+
+class Command(BaseCommand):
+    help = "Time Bearer authenticated API requests through the stock and the lean middleware stacks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='/auth/users/me/', help="Endpoint to request")
+        parser.add_argument('--repeat', type=int, default=500, help="Requests per stack")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = CustomUser.objects.create(username='bench_jwt', email='jwt@bench.test', role='member')
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+            stock_middleware = [STOCK.get(path, path) for path in settings.MIDDLEWARE]
+            with override_settings(MIDDLEWARE=stock_middleware):
+                stock = Client()
+                stock.get(options['url'], **headers)  # builds the middleware chain under the override
+            lean = Client()
+            lean.get(options['url'], **headers)
+
+            timings = {'stock': [], 'lean': []}
+            queries = {}
+            for _ in range(options['repeat']):
+                # interleaved, so drift in machine load hits both stacks alike
+                for name, client in (('stock', stock), ('lean', lean)):
+                    cache.clear()  # throttle counters
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response = client.get(options['url'], **headers)
+                        timings[name].append((time.perf_counter() - started) * 1000)
+                    queries[name] = len(captured)
+                    if response.status_code != 200:
+                        self.stderr.write(f"{name}: GET {options['url']} returned {response.status_code}")
+                        return
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"GET {options['url']} with a Bearer token, {options['repeat']} requests per stack")
+        medians = {name: statistics.median(values) for name, values in timings.items()}
+        for name in ('stock', 'lean'):
+            self.stdout.write(f"{name:<6} median {medians[name]:.3f}ms  {queries[name]} queries")
+        saved = medians['stock'] - medians['lean']
+        self.stdout.write(f"saved  {saved * 1000:.0f}us per request ({saved / medians['stock']:.1%})")
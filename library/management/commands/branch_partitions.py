@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from library import partitions
+from users.models import Branch
+
+
+class Command(BaseCommand):
+    help = "Keep one BorrowRecord list partition per branch, optionally converting the table first (postgres)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="One-off: rebuild library_borrowrecord as a branch list partitioned table. Locks the table, "
+                 "run it in a maintenance window",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Branch partitions need postgres, other databases rely on the branch leading indexes.")
+
+        branch_ids = list(Branch.objects.order_by('id').values_list('id', flat=True))
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not partitions.is_partitioned(cursor, partitions.BORROW_TABLE):
+                if not options['convert']:
+                    raise CommandError(f"{partitions.BORROW_TABLE} is not partitioned, run with --convert first.")
+                cursor.execute(f'LOCK TABLE {partitions.BORROW_TABLE} IN ACCESS EXCLUSIVE MODE')
+                partitions.partition_borrow_records_by_branch(cursor, branch_ids)
+                self.stdout.write(f"Converted {partitions.BORROW_TABLE} into {len(branch_ids)} branch partitions.")
+                return
+            for name in partitions.ensure_branch_partitions(cursor, branch_ids):
+                self.stdout.write(f"Created partition {name}")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from library import recommendations
+
+
+class Command(BaseCommand):
+    help = "Update the 'members also borrowed' co-occurrence counts and top-K neighbours per book."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild from the whole borrow history")
+        parser.add_argument('--top-k', type=int, help="Neighbours kept per book (default RECOMMENDATION_TOP_K)")
+
+    def handle(self, *args, **options):
+        if options['full']:
+            books = recommendations.build_full(options['top_k'])
+        else:
+            books = recommendations.build_incremental(options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f"Recommendations refreshed for {books} books."))
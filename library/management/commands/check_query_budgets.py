@@ -0,0 +1,172 @@
+import datetime
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from library import autocomplete, recommendations, rollups
+from library.models import ArchivedBorrowRecord, Author, Book, BorrowRecord, CirculationEvent, DeletionJob
+from library.query_budget import Measurement, measure
+from users.models import Branch, CustomUser
+
+
+def seed(rows):
+    """
+    `rows` authors, books, members and loans, plus the derived tables the read endpoints serve.
+    """
+    branch = Branch.objects.create(name='Budget branch', code='budget')
+    users = {
+        'librarian': CustomUser.objects.create(username='budget_librarian', email='librarian@budget.test', role='librarian', branch=branch),
+        'admin': CustomUser.objects.create(username='budget_admin', email='admin@budget.test', role='admin'),
+        'member': CustomUser.objects.create(username='budget_member', email='member@budget.test', role='member', branch=branch),
+    }
+    members = [users['member']] + [
+        CustomUser.objects.create(username=f'budget_member_{i}', email=f'member{i}@budget.test', role='member', branch=branch)
+        for i in range(rows - 1)
+    ]
+    authors = [Author.objects.create(name=f'Author {i}', biography='-') for i in range(rows)]
+    books = [
+        Book.objects.create(title=f'Book {i}', author=authors[i], ISBN=f'978{i:010d}', category=f'Category {i % 3}', branch=branch)
+        for i in range(rows)
+    ]
+    today = timezone.now().date()
+    for i in range(rows):
+        record = BorrowRecord.objects.create(book=books[i], member=members[i % len(members)])
+        CirculationEvent.log('borrow', record)
+        if i % 2:
+            record.return_date = today
+            record.save()
+            CirculationEvent.log('return', record)
+        ArchivedBorrowRecord.objects.create(
+            id=10 ** 9 + i, book=books[(i + 1) % rows], member=members[i % len(members)], branch=branch,
+            borrow_date=today - datetime.timedelta(days=400), return_date=today - datetime.timedelta(days=390),
+        )
+    DeletionJob.objects.bulk_create([DeletionJob(model='book', object_id=10 ** 9 + i, status='done', branch=branch) for i in range(rows)])
+    recommendations.build_full()
+    rollups.rebuild_days(today - datetime.timedelta(days=400), today + datetime.timedelta(days=1))
+    return users, books[0]
+
+
+def function_views(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from function_views(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name and hasattr(pattern.callback, 'cls'):
+            if not hasattr(pattern.callback, 'actions'):  # router viewsets are covered through router.registry
+                yield pattern
+
+
+def endpoints(sample_pks):
+    """
+    (label, url, budget) for every GET endpoint with a budget, plus labels of endpoints without one.
+    """
+    from library_management.urls import router
+
+    found = []
+    missing = []
+    for prefix, viewset, basename in router.registry:
+        budgets = getattr(viewset, 'query_budgets', {})
+        model = viewset.queryset.model
+        actions = [('list', False), ('retrieve', True)]
+        actions += [(action.__name__, action.detail) for action in viewset.get_extra_actions() if 'get' in action.mapping]
+        for name, detail in actions:
+            label = f'{viewset.__name__}.{name}'
+            if name not in budgets:
+                missing.append(label)
+                continue
+            url_name = {'list': 'list', 'retrieve': 'detail'}.get(name)
+            if url_name is None:
+                url_name = next(a.url_name for a in viewset.get_extra_actions() if a.__name__ == name)
+            if detail:
+                pk = sample_pks.get(model) or model._base_manager.order_by('pk').values_list('pk', flat=True).first()
+                kwargs = {'pk': pk}
+            else:
+                kwargs = {}
+            found.append((label, reverse(f'{basename}-{url_name}', kwargs=kwargs), budgets[name]))
+
+    seen = set()
+    for pattern in function_views(get_resolver().url_patterns):
+        view = pattern.callback
+        if 'get' not in view.cls.http_method_names or not view.__module__.startswith(('library.', 'users.')):
+            continue
+        if pattern.name in seen:
+            continue
+        seen.add(pattern.name)
+        if getattr(view, 'query_budget', None) is None:
+            missing.append(view.cls.__name__)
+        else:
+            found.append((view.cls.__name__, reverse(pattern.name), view.query_budget))
+    return found, missing
+
+
+class Command(BaseCommand):
+    help = "Run every API GET endpoint against seeded data of two sizes and enforce the declared query budgets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--small', type=int, default=3, help="Rows per table in the small dataset")
+        parser.add_argument('--large', type=int, default=30, help="Rows per table in the large dataset, above PAGE_SIZE")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse the test database")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        # seeded changes are brand new, without this /sync/changes/ would hold them all back
+        lag = override_settings(SYNC_SAFETY_LAG_SECONDS=0)
+        lag.enable()
+        try:
+            measurements = {}
+            missing = []
+            for size in (options['small'], options['large']):
+                with transaction.atomic():
+                    users, book = seed(size)
+                    sample_pks = {
+                        Author: book.author_id, Book: book.pk, CustomUser: users['member'].pk,
+                        BorrowRecord: BorrowRecord.objects.filter(member=users['member']).values_list('pk', flat=True).first(),
+                        CirculationEvent: CirculationEvent.objects.filter(member=users['member']).values_list('pk', flat=True).first(),
+                    }
+                    found, missing = endpoints(sample_pks)
+                    for label, url, budget in found:
+                        cache.clear()  # throttle counters
+                        client = APIClient()
+                        client.force_authenticate(users[budget.role])
+                        client.get(url, budget.params)  # warm up per-process caches (autocomplete index, serializer fields)
+                        status, captured, ms = measure(client, url, budget.params)
+                        measurements.setdefault(label, Measurement(label, budget)).record(size, status, captured, ms)
+                    transaction.set_rollback(True)
+                for index in (autocomplete.book_titles, autocomplete.author_names):
+                    index.reset()
+        finally:
+            lag.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        failed = self.report(measurements, sorted((options['small'], options['large'])))
+        for label in missing:
+            self.stdout.write(self.style.WARNING(f"no query budget declared: {label}"))
+        if failed:
+            raise CommandError(f"{failed} endpoint(s) over budget")
+        self.stdout.write(self.style.SUCCESS(f"All {len(measurements)} endpoints within budget."))
+
+    def report(self, measurements, sizes):
+        failed = 0
+        for label, measurement in sorted(measurements.items()):
+            runs = '  '.join(
+                f"{size} rows: {measurement.runs[size][1]}q {measurement.runs[size][2]:.1f}ms" for size in sizes
+            )
+            problems = measurement.problems()
+            line = f"{label:<50} {runs}  (budget {measurement.budget.queries}q"
+            line += f", {measurement.budget.ms}ms)" if measurement.budget.ms else ")"
+            if not problems:
+                self.stdout.write(line)
+                continue
+            failed += 1
+            self.stdout.write(self.style.ERROR(line))
+            for problem in problems:
+                self.stdout.write(f"    - {problem}")
+            for sql, count in measurement.repeated_sql():
+                self.stdout.write(f"    {count}x {sql[:200]}")
+        return failed
@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from library import partitions
+from library.models import CirculationEvent
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly CirculationEvent partitions and drop expired ones (postgres)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help="Months ahead to prepare, including the current one")
+        parser.add_argument('--prune-before', help="Drop whole months of events before this date (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        prune_before = None
+        if options['prune_before']:
+            try:
+                prune_before = datetime.date.fromisoformat(options['prune_before'])
+            except ValueError:
+                raise CommandError("--prune-before must be a YYYY-MM-DD date")
+
+        if connection.vendor != 'postgresql':
+            # unpartitioned dev databases: fall back to an indexed range delete
+            if prune_before:
+                cutoff = datetime.datetime.combine(partitions.month_start(prune_before), datetime.time(), tzinfo=datetime.timezone.utc)
+                deleted, _ = CirculationEvent.objects.filter(occurred_at__lt=cutoff).delete()
+                self.stdout.write(f"Deleted {deleted} events before {cutoff:%Y-%m}.")
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for name in partitions.ensure_partitions(cursor, timezone.now().date(), options['months']):
+                self.stdout.write(f"Created partition {name}")
+            if prune_before:
+                for name in partitions.drop_partitions_before(cursor, prune_before):
+                    self.stdout.write(f"Dropped partition {name}")
+                deleted = partitions.prune_default_before(cursor, prune_before)
+                self.stdout.write(f"Deleted {deleted} events before {partitions.month_start(prune_before):%Y-%m} from the default partition.")
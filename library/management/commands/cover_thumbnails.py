@@ -0,0 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from library import covers
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = "Render missing or outdated cover thumbnails, e.g. after a worker restart lost queued renders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'COVER_THUMBNAIL_WORKERS', 2) or 1)
+        parser.add_argument('--all', action='store_true', help="Re-render every cover, e.g. after changing COVER_THUMBNAIL_SIZES")
+
+    def handle(self, *args, **options):
+        sizes = getattr(settings, 'COVER_THUMBNAIL_SIZES', {'small': 160, 'medium': 320})
+        books = Book.objects.exclude(cover='').only('id', 'cover', 'cover_thumbnails')
+        pending = [
+            (book.pk, book.cover.name) for book in books.iterator(chunk_size=2000)
+            if options['all'] or book.cover_thumbnails.get('source') != book.cover.name
+            or set(book.cover_thumbnails) - {'source'} != set(sizes)
+        ]
+        if not pending:
+            self.stdout.write("All cover thumbnails are up to date.")
+            return
+
+        done = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [
+                (book_id, source, pool.submit(covers.render_thumbnails, default_storage.path(source), sizes))
+                for book_id, source in pending
+            ]
+            for book_id, source, future in futures:
+                try:
+                    covers.store_thumbnails(book_id, source, future.result())
+                except Exception as e:  # unreadable or missing file, keep going
+                    self.stderr.write(f"book {book_id}: {source}: {e}")
+                    continue
+                done += 1
+        self.stdout.write(self.style.SUCCESS(f"Rendered thumbnails for {done} of {len(pending)} covers."))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from library import deletion
+
+
+class Command(BaseCommand):
+    help = "Work through pending Author/Book deletion jobs, removing dependents in bounded batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per DELETE statement")
+        parser.add_argument('--max-jobs', type=int, help="Stop after this many jobs")
+
+    def handle(self, *args, **options):
+        processed = 0
+        while options['max_jobs'] is None or processed < options['max_jobs']:
+            job = deletion.claim_next()
+            if job is None:
+                break
+            self.stdout.write(f"Deleting {job.model} {job.object_id} (job {job.pk})...")
+            try:
+                job = deletion.run(job, options['batch_size'])
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"job {job.pk} failed: {e}"))
+            else:
+                self.stdout.write(f"job {job.pk} done, {job.deleted_rows} rows removed")
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} deletion jobs."))
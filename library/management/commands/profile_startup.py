@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+BOOT = "from library_management.wsgi import app"
+
+
+def parse_importtime(stderr):
+    """
+    (module, self_us, cumulative_us) rows from `python -X importtime` output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Import the WSGI app in a fresh interpreter under -X importtime and report where startup time goes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help="Rows per table")
+        parser.add_argument('--lean', action='store_true', help="Profile with ENABLE_ADMIN=False and ENABLE_API_DOCS=False")
+        parser.add_argument('--no-warm-up', action='store_true', help="Profile with WARM_UP_ON_START=False")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        if options['lean']:
+            env.update(ENABLE_ADMIN='False', ENABLE_API_DOCS='False')
+        if options['no_warm_up']:
+            env['WARM_UP_ON_START'] = 'False'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT], env=env, capture_output=True, text=True,
+        )
+        rows = parse_importtime(result.stderr)
+        if result.returncode or not rows:
+            raise CommandError(f"booting the app failed:\n{result.stderr[-2000:]}")
+
+        packages = defaultdict(int)
+        for module, self_us, _ in rows:
+            packages[module.split('.')[0]] += self_us
+        total = sum(self_us for _, self_us, _ in rows)
+        top = options['top']
+
+        self.stdout.write(f"{len(rows)} modules imported, {total / 1000:.1f}ms total import time\n")
+        self.stdout.write("by top level package (self time):")
+        for package, us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {us / 1000:8.1f}ms  {us / total:6.1%}  {package}")
+        self.stdout.write("\nslowest modules (self time):")
+        for module, self_us, cumulative_us in sorted(rows, key=lambda row: -row[1])[:top]:
+            self.stdout.write(f"  {self_us / 1000:8.1f}ms  (cumulative {cumulative_us / 1000:7.1f}ms)  {module}")
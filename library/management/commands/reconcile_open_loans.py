@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from library.models import BorrowRecord
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Compare CustomUser.open_loans with the actual open BorrowRecords and optionally repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite drifted counters, otherwise only report them")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        drifted = []
+        checked = 0
+        last_id = 0
+        while True:
+            # keyset batches of users, one grouped count of open loans per batch
+            users = list(
+                CustomUser.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'open_loans')[:options['batch_size']]
+            )
+            if not users:
+                break
+            ids = [user_id for user_id, _ in users]
+            actual = dict(
+                BorrowRecord.objects.filter(member_id__in=ids, return_date__isnull=True)
+                .order_by().values('member_id').annotate(n=Count('id')).values_list('member_id', 'n')
+            )
+            drifted += [(user_id, counter, actual.get(user_id, 0)) for user_id, counter in users if counter != actual.get(user_id, 0)]
+            checked += len(users)
+            last_id = ids[-1]
+
+        for user_id, counter, count in drifted:
+            self.stdout.write(f"user {user_id}: counter {counter}, open loans {count}")
+        if options['fix']:
+            for user_id, _, _ in drifted:
+                self.repair(user_id)
+        verb = 'repaired' if options['fix'] else 'found'
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} users, {verb} {len(drifted)} drifted counters."))
+
+    def repair(self, user_id):
+        # recount under the user's row lock, borrow/return update the same row so none slip in between
+        with transaction.atomic():
+            CustomUser.objects.select_for_update().filter(pk=user_id).values_list('pk').first()
+            count = BorrowRecord.objects.filter(member_id=user_id, return_date__isnull=True).count()
+            CustomUser.objects.filter(pk=user_id).update(open_loans=count)
@@ -0,0 +1,34 @@
+# backfill: normalize stored ISBNs to bare 13 digit form
+
+from django.db import migrations
+from django.core.exceptions import ValidationError
+
+
+def normalize_isbns(apps, schema_editor):
+    from library.utils import normalize_isbn
+    Book = apps.get_model('library', 'Book')
+    taken = set(Book.objects.values_list('ISBN', flat=True))
+    changed = []
+    for book in Book.objects.only('id', 'ISBN').iterator(chunk_size=2000):
+        try:
+            isbn = normalize_isbn(book.ISBN)
+        except ValidationError:
+            continue  # leave invalid legacy values for manual review
+        if isbn == book.ISBN or isbn in taken:
+            continue  # already normalized, or would collide with another row
+        taken.discard(book.ISBN)
+        taken.add(isbn)
+        book.ISBN = isbn
+        changed.append(book)
+    Book.objects.bulk_update(changed, ['ISBN'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_isbns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# trigram indexes for title/name prefix and substring search, postgres only
+
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # django's istartswith/icontains compile to UPPER(col) LIKE UPPER(...), so index that expression
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS library_book_title_trgm '
+        'ON library_book USING gin (UPPER(title) gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS library_author_name_trgm '
+        'ON library_author USING gin (UPPER(name) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS library_book_title_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS library_author_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_normalize_isbn'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
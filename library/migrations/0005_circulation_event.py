@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_event_table(apps, schema_editor):
+    CirculationEvent = apps.get_model('library', 'CirculationEvent')
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(CirculationEvent)
+        return
+    from library import partitions
+    with schema_editor.connection.cursor() as cursor:
+        partitions.create_partitioned_table(cursor)
+        partitions.ensure_partitions(cursor, timezone.now().date(), 3)
+
+
+def drop_event_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model('library', 'CirculationEvent'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # postgres gets a month range partitioned table, which CreateModel can't express
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='CirculationEvent',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('event_type', models.CharField(choices=[('borrow', 'Borrow'), ('return', 'Return')], max_length=10)),
+                        ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+                        ('borrow_record_id', models.BigIntegerField()),
+                        ('book', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='library.book')),
+                        ('member', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['book', 'occurred_at'], name='circ_event_book_time_idx'), models.Index(fields=['member', 'occurred_at'], name='circ_event_member_time_idx'), models.Index(fields=['occurred_at'], name='circ_event_time_idx')],
+                    },
+                ),
+            ],
+        ),
+        migrations.RunPython(create_event_table, drop_event_table),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:53
+
+from django.db import migrations, models
+
+
+def seed_changes(apps, schema_editor):
+    # every existing row becomes one change, so a sync without a cursor returns the full catalog
+    SyncChange = apps.get_model('library', 'SyncChange')
+    for model_name in ['author', 'book', 'borrowrecord']:
+        Model = apps.get_model('library', model_name)
+        fields = ['id', 'member_id'] if model_name == 'borrowrecord' else ['id']
+        rows = Model.objects.order_by('id').values_list(*fields).iterator(chunk_size=2000)
+        SyncChange.objects.bulk_create(
+            (SyncChange(model=model_name, object_id=row[0], member_id=row[1] if len(row) > 1 else None) for row in rows),
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_archived_borrow_record'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('member_id', models.BigIntegerField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'object_id'], name='sync_change_object_idx')],
+            },
+        ),
+        migrations.RunPython(seed_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_sync_changes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_borrow_record_id', models.BigIntegerField()),
+                ('full', models.BooleanField(default=False)),
+                ('built_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='library.book')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('book', 'rank'), name='book_neighbour_rank_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CoBorrowCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('book', 'other'), name='coborrow_pair_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActiveMembers',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('active_members', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCategoryBorrows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(max_length=100)),
+                ('borrows', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'category'), name='daily_category_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyTitleBorrows',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('borrows', models.PositiveIntegerField(default=0)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'book'), name='daily_title_unique')],
+            },
+        ),
+    ]
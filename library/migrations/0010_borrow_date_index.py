@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_daily_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['borrow_date'], name='borrow_record_date_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def assign_main_branch(apps, schema_editor):
+    # everything catalogued so far belongs to the main branch created in users.0004
+    Branch = apps.get_model('users', 'Branch')
+    Book = apps.get_model('library', 'Book')
+    main, _ = Branch.objects.get_or_create(code='main', defaults={'name': 'Main branch'})
+    Book.objects.update(branch=main)
+    book_branch = Subquery(Book.objects.filter(pk=OuterRef('book_id')).values('branch_id')[:1])
+    for model_name in ['BorrowRecord', 'ArchivedBorrowRecord']:
+        apps.get_model('library', model_name).objects.update(branch_id=book_branch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_deletion_jobs'),
+        ('users', '0004_branches'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedborrowrecord',
+            name='branch',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.branch'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='branch',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='books', to='users.branch'),
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='branch',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='borrow_records', to='users.branch'),
+        ),
+        migrations.RunPython(assign_main_branch, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='book',
+            name='branch',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='books', to='users.branch'),
+        ),
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='branch',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='borrow_records', to='users.branch'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['branch', 'id'], name='book_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['branch', 'member'], name='borrow_branch_member_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['branch', 'borrow_date'], name='borrow_branch_date_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_branches'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='syncchange',
+            index=models.Index(fields=['model', 'id'], name='sync_change_version_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:12
+
+import library.covers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0013_sync_change_version_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover',
+            field=models.ImageField(blank=True, upload_to=library.covers.cover_upload_to),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:40
+
+import django.db.models.deletion
+from collections import Counter, defaultdict
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rebuild_branch_rollups(apps, schema_editor):
+    # the category and per-branch active member rollups are derived data, recomputed from borrow history
+    DailyCategoryBorrows = apps.get_model('library', 'DailyCategoryBorrows')
+    DailyBranchActiveMembers = apps.get_model('library', 'DailyBranchActiveMembers')
+    categories = Counter()
+    members = defaultdict(set)
+    for model_name in ['BorrowRecord', 'ArchivedBorrowRecord']:
+        loans = apps.get_model('library', model_name).objects.all()
+        for row in loans.values('borrow_date', 'book__branch_id', 'book__category').annotate(n=Count('id')):
+            categories[(row['borrow_date'], row['book__branch_id'], row['book__category'])] += row['n']
+        for day, branch_id, member_id in loans.values_list('borrow_date', 'book__branch_id', 'member_id').distinct():
+            members[(day, branch_id)].add(member_id)
+    DailyCategoryBorrows.objects.all().delete()
+    DailyCategoryBorrows.objects.bulk_create(
+        [
+            DailyCategoryBorrows(day=day, branch_id=branch_id, category=category, borrows=n)
+            for (day, branch_id, category), n in categories.items()
+        ],
+        batch_size=2000,
+    )
+    DailyBranchActiveMembers.objects.bulk_create(
+        [
+            DailyBranchActiveMembers(day=day, branch_id=branch_id, active_members=len(ids))
+            for (day, branch_id), ids in members.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0014_book_covers'),
+        ('users', '0004_branches'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailycategoryborrows',
+            name='daily_category_unique',
+        ),
+        migrations.AddField(
+            model_name='dailycategoryborrows',
+            name='branch',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.branch'),
+        ),
+        migrations.CreateModel(
+            name='DailyBranchActiveMembers',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('active_members', models.PositiveIntegerField(default=0)),
+                ('branch', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.branch')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('branch', 'day'), name='daily_branch_active_unique')],
+            },
+        ),
+        migrations.RunPython(rebuild_branch_rollups, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dailycategoryborrows',
+            name='branch',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='users.branch'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategoryborrows',
+            constraint=models.UniqueConstraint(fields=('day', 'branch', 'category'), name='daily_category_branch_unique'),
+        ),
+    ]
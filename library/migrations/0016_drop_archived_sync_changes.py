@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def drop_archived_sync_changes(apps, schema_editor):
+    # archive runs before the version marker left the moved loans' change feed entries behind
+    SyncChange = apps.get_model('library', 'SyncChange')
+    ArchivedBorrowRecord = apps.get_model('library', 'ArchivedBorrowRecord')
+    archived = SyncChange.objects.filter(model='borrowrecord', object_id__in=ArchivedBorrowRecord.objects.values('id'))
+    if archived.exists():
+        archived.delete()
+        SyncChange.objects.create(model='borrowrecord', object_id=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0015_branch_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_archived_sync_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_job_branches(apps, schema_editor):
+    DeletionJob = apps.get_model('library', 'DeletionJob')
+    Book = apps.get_model('library', 'Book')
+    for job in DeletionJob.objects.filter(branch__isnull=True).select_related('requested_by'):
+        branch_id = job.requested_by.branch_id if job.requested_by else None
+        if job.model == 'book':
+            # purged books are gone, their requester's branch is the best guess
+            branch_id = Book.objects.filter(pk=job.object_id).values_list('branch_id', flat=True).first() or branch_id
+        if branch_id is not None:
+            job.branch_id = branch_id
+            job.save(update_fields=['branch'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0016_drop_archived_sync_changes'),
+        ('users', '0006_activation_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletionjob',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='users.branch'),
+        ),
+        migrations.RunPython(backfill_job_branches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:52
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_branches(apps, schema_editor):
+    # tombstones of rows already purged keep a null branch and stay visible to every branch
+    SyncChange = apps.get_model('library', 'SyncChange')
+    for model_name, model in [('book', 'Book'), ('borrowrecord', 'BorrowRecord')]:
+        rows = apps.get_model('library', model).objects.filter(pk=OuterRef('object_id'))
+        SyncChange.objects.filter(model=model_name).update(branch_id=Subquery(rows.values('branch_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0017_deletion_job_branch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncchange',
+            name='branch_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_branches, migrations.RunPython.noop),
+    ]
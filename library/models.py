@@ -1,11 +1,17 @@
 from django.db import models
-from users.models import CustomUser
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from users.models import CustomUser, Branch
+from .utils import normalize_isbn
+from .covers import cover_upload_to
 
 # Create your models here.
 
 class Author(models.Model):
     name = models.CharField(max_length=100)
     biography = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+    pending_deletion = models.BooleanField(default=False)  # hidden, removed by a DeletionJob
 
     def __str__(self):
         return self.name
@@ -16,10 +22,44 @@ class Book(models.Model):
     ISBN = models.CharField(max_length=13, unique=True)
     category = models.CharField(max_length=100)
     availability_status = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    pending_deletion = models.BooleanField(default=False)  # hidden, removed by a DeletionJob
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='books', db_index=False)
+    cover = models.ImageField(upload_to=cover_upload_to, blank=True)
+    # {'source': cover name, 'small': ..., 'medium': ...}, filled in by library.covers
+    cover_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # branch leading, so a branch's catalog is one contiguous index range however many branches exist
+            models.Index(fields=['branch', 'id'], name='book_branch_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # cover as loaded, so saves that keep it don't queue thumbnail renders (signals.render_cover_thumbnails)
+        if 'cover' in field_names:
+            instance._loaded_cover = values[field_names.index('cover')]
+        return instance
+
+    def clean(self):
+        try:
+            self.ISBN = normalize_isbn(self.ISBN)
+        except ValidationError as e:
+            raise ValidationError({'ISBN': e.messages})
+
+    def save(self, *args, **kwargs):
+        # store ISBNs in one canonical 13 digit form so exact lookups hit the unique index
+        try:
+            self.ISBN = normalize_isbn(self.ISBN)
+        except ValidationError:
+            pass  # keep legacy/unparseable values as they are, serializers reject them on input
+        super().save(*args, **kwargs)
+
 """
 # were used for assignment 22.5, now integrated in CustomUser
 class Member(models.Model):
@@ -36,6 +76,267 @@ class BorrowRecord(models.Model):
     member = models.ForeignKey(CustomUser, on_delete=models.CASCADE)  # changed
     borrow_date = models.DateField(auto_now_add=True)
     return_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # copied from the book when the loan is created, the list partition key on postgres
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='borrow_records', db_index=False, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['borrow_date'], name='borrow_record_date_idx'),  # admin date_hierarchy
+            models.Index(fields=['branch', 'member'], name='borrow_branch_member_idx'),
+            models.Index(fields=['branch', 'borrow_date'], name='borrow_branch_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.member.username} - {self.book.title}"
+
+    def save(self, *args, **kwargs):
+        if self.branch_id is None and self.book_id is not None:
+            self.branch_id = Book.objects.filter(pk=self.book_id).values_list('branch_id', flat=True).first()
+        super().save(*args, **kwargs)
+
+    def adjust_open_loans(self, previous=None):
+        """
+        Move the members' open_loans counters after an edit; `previous` is the
+        saved (member_id, open) before it, None for a new record. Deletes are
+        handled by the post_delete signal.
+        """
+        current = (self.member_id, self.return_date is None)
+        if previous == current:
+            return
+        if previous is not None and previous[1]:
+            CustomUser.adjust_open_loans(previous[0], -1)
+        if current[1]:
+            CustomUser.adjust_open_loans(self.member_id, 1)
+
+
+class ArchivedBorrowRecord(models.Model):
+    """
+    Returned BorrowRecords moved out of the hot table by the archive_borrow_records
+    command. Keeps the original id, so archived and live rows never collide when
+    BorrowRecordViewSet merges them for ?include_archived=true.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    member = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, null=True, related_name='+')
+    borrow_date = models.DateField()
+    return_date = models.DateField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['member', 'borrow_date'], name='archived_borrow_member_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} - {self.book_id} (archived)"
+
+class CoBorrowCount(models.Model):
+    """
+    Sparse book x book co-occurrence matrix: `count` members borrowed both `book`
+    and `other`. Stored in both directions, maintained by build_recommendations.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'other'], name='coborrow_pair_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} x {self.other_id}: {self.count}"
+
+
+class BookNeighbour(models.Model):
+    """
+    Top-K "members also borrowed" titles per book, read by /books/{id}/related/.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='neighbours')
+    related = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'rank'], name='book_neighbour_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.related_id} (#{self.rank})"
+
+
+class RecommendationBuild(models.Model):
+    """
+    One build_recommendations run; last_borrow_record_id is the watermark the next
+    incremental run continues from.
+    """
+    last_borrow_record_id = models.BigIntegerField()
+    full = models.BooleanField(default=False)
+    built_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{'full' if self.full else 'incremental'} build up to {self.last_borrow_record_id}"
+
+
+# daily circulation rollups, kept current by library.rollups on every new BorrowRecord
+
+class DailyCategoryBorrows(models.Model):
+    day = models.DateField()
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='+', db_index=False)  # the book's branch
+    category = models.CharField(max_length=100)
+    borrows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'branch', 'category'], name='daily_category_branch_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.branch_id} {self.category}: {self.borrows}"
+
+
+class DailyTitleBorrows(models.Model):
+    day = models.DateField()
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    borrows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'book'], name='daily_title_unique'),
+        ]
 
     def __str__(self):
-        return f"{self.member.name} - {self.book.title}"
\ No newline at end of file
+        return f"{self.day} {self.book_id}: {self.borrows}"
+
+
+class DailyActiveMembers(models.Model):
+    day = models.DateField(unique=True)
+    active_members = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.active_members}"
+
+
+class DailyBranchActiveMembers(models.Model):
+    # members borrowing at several branches count once per branch, so these don't add up to DailyActiveMembers
+    day = models.DateField()
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='+', db_index=False)
+    active_members = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'day'], name='daily_branch_active_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.branch_id}: {self.active_members}"
+
+
+class SyncChange(models.Model):
+    """
+    Change feed behind /sync/changes/. The auto-increment id is the change
+    sequence; each object keeps only its latest entry, so the table stays about
+    as large as the catalog plus tombstones for deleted rows. Bulk moves that
+    send no signals (archiving) drop their rows' entries and leave one version
+    marker per model, object id 0, so table versions still move.
+    """
+    VERSION_MARKER = 0  # object_id of the per-model marker, never a real row
+    model = models.CharField(max_length=20)  # 'author', 'book' or 'borrowrecord'
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    member_id = models.BigIntegerField(null=True, blank=True)  # owner of a borrow record, for member scoping
+    branch_id = models.BigIntegerField(null=True, blank=True)  # branch of a book or borrow record, for branch scoping
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='sync_change_object_idx'),
+            models.Index(fields=['model', 'id'], name='sync_change_version_idx'),  # table versions for ETags
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.model} {self.object_id}{' (deleted)' if self.deleted else ''}"
+
+    @classmethod
+    def record(cls, instance, deleted=False):
+        model = instance._meta.model_name
+        cls.objects.filter(model=model, object_id=instance.pk).delete()
+        return cls.objects.create(
+            model=model,
+            object_id=instance.pk,
+            deleted=deleted,
+            member_id=getattr(instance, 'member_id', None),
+            branch_id=getattr(instance, 'branch_id', None),
+        )
+
+    @classmethod
+    def bump(cls, model):
+        cls.objects.filter(model=model, object_id=cls.VERSION_MARKER).delete()
+        return cls.objects.create(model=model, object_id=cls.VERSION_MARKER)
+
+
+DELETION_JOB_STATUSES = (('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'))
+
+class DeletionJob(models.Model):
+    """
+    Background removal of an Author or Book and everything that cascades from it,
+    processed in bounded batches by `manage.py process_deletions`.
+    """
+    model = models.CharField(max_length=20)  # 'author' or 'book'
+    object_id = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=DELETION_JOB_STATUSES, default='pending')
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # branch of the deleted book, or of the librarian who deleted an author; null = listed to unscoped staff only
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='deletion_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"delete {self.model} {self.object_id} ({self.status})"
+
+
+CIRCULATION_EVENT_TYPES = (('borrow', 'Borrow'), ('return', 'Return'))
+
+class CirculationEvent(models.Model):
+    """
+    Append-only log of borrows and returns, written in the same transaction as the
+    BorrowRecord/Book update. On postgres the table is range partitioned by month
+    on occurred_at (see migration 0005 and the circulation_partitions command), so
+    old months are dropped by detaching a partition instead of a table-wide DELETE.
+    Relations are not enforced in the db, events outlive the rows they describe.
+    """
+    event_type = models.CharField(max_length=10, choices=CIRCULATION_EVENT_TYPES)
+    occurred_at = models.DateTimeField(default=timezone.now)
+    # indexed through the composite (…, occurred_at) indexes below
+    book = models.ForeignKey(Book, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    member = models.ForeignKey(CustomUser, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+')
+    borrow_record_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', 'occurred_at'], name='circ_event_book_time_idx'),
+            models.Index(fields=['member', 'occurred_at'], name='circ_event_member_time_idx'),
+            models.Index(fields=['occurred_at'], name='circ_event_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} book={self.book_id} member={self.member_id} at {self.occurred_at:%Y-%m-%d %H:%M}"
+
+    @classmethod
+    def log(cls, event_type, borrow_record):
+        return cls.objects.create(
+            event_type=event_type,
+            book_id=borrow_record.book_id,
+            member_id=borrow_record.member_id,
+            borrow_record_id=borrow_record.pk,
+        )
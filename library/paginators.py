@@ -0,0 +1,27 @@
+# library/paginators.py
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin changelist paginator that skips the exact COUNT(*) on big unfiltered tables.
+    On postgres the planner's row estimate (pg_class.reltuples) is used once it is
+    above ESTIMATE_THRESHOLD; filtered querysets and small tables are counted exactly.
+    """
+    ESTIMATE_THRESHOLD = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[queryset.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [queryset.model._meta.db_table])
+                    row = cursor.fetchone()
+                if row and row[0] > self.ESTIMATE_THRESHOLD:
+                    return int(row[0])
+        return super().count
@@ -0,0 +1,180 @@
+# library/partitions.py
+# monthly range partitions for CirculationEvent, and optional per-branch list
+# partitions for BorrowRecord, on postgres
+import datetime
+
+TABLE = 'library_circulationevent'
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y%m}'
+
+
+def create_partitioned_table(cursor):
+    cursor.execute(f'''
+        CREATE TABLE {TABLE} (
+            id bigserial NOT NULL,
+            event_type varchar(10) NOT NULL,
+            occurred_at timestamp with time zone NOT NULL,
+            borrow_record_id bigint NOT NULL,
+            book_id bigint NOT NULL,
+            member_id bigint NOT NULL,
+            PRIMARY KEY (id, occurred_at)
+        ) PARTITION BY RANGE (occurred_at)
+    ''')
+    # indexes declared on the parent are created on every partition
+    cursor.execute(f'CREATE INDEX circ_event_book_time_idx ON {TABLE} (book_id, occurred_at)')
+    cursor.execute(f'CREATE INDEX circ_event_member_time_idx ON {TABLE} (member_id, occurred_at)')
+    cursor.execute(f'CREATE INDEX circ_event_time_idx ON {TABLE} (occurred_at)')
+    # catches rows outside the prepared months so inserts never fail
+    cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+
+def ensure_partitions(cursor, start, months):
+    """
+    Create monthly partitions from the month of `start` for `months` months.
+    Events of a month that fell into the default partition (e.g. after a missed
+    run) are moved across before the partition is attached, otherwise postgres
+    rejects the new partition because its range overlaps rows in the default.
+    """
+    created = []
+    default = f'{TABLE}_default'
+    month = month_start(start)
+    for _ in range(months):
+        name = partition_name(month)
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is None:
+            bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+            cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM {default} WHERE occurred_at >= %s AND occurred_at < %s RETURNING *) '
+                f'INSERT INTO {name} SELECT * FROM moved',
+                bounds,
+            )
+            cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', bounds)
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def list_partitions(cursor):
+    cursor.execute('''
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE parent.relname = %s ORDER BY child.relname
+    ''', [TABLE])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def drop_partitions_before(cursor, before):
+    """
+    Detach and drop whole monthly partitions that end on or before `before`.
+    No rows are deleted one by one, the month's table is simply dropped.
+    """
+    cutoff = partition_name(month_start(before))
+    dropped = []
+    for name in list_partitions(cursor):
+        if name == f'{TABLE}_default' or name >= cutoff:
+            continue
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+        cursor.execute(f'DROP TABLE {name}')
+        dropped.append(name)
+    return dropped
+
+
+def prune_default_before(cursor, before):
+    """
+    Delete events older than the month of `before` that sit in the default
+    partition, they are never covered by a monthly partition drop.
+    """
+    cursor.execute(f'DELETE FROM {TABLE}_default WHERE occurred_at < %s', [month_start(before).isoformat()])
+    return cursor.rowcount
+
+
+# BorrowRecord by branch: LIST partitions keyed on branch_id. Optional, the
+# branch leading indexes already keep per-branch queries flat; partitions add
+# per-branch vacuum/maintenance and let a closed branch be detached whole.
+
+BORROW_TABLE = 'library_borrowrecord'
+
+
+def branch_partition_name(branch_id):
+    return f'{BORROW_TABLE}_b{branch_id}'
+
+
+def is_partitioned(cursor, table):
+    cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s', [table])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partition_borrow_records_by_branch(cursor, branch_ids):
+    """
+    One-off conversion of the BorrowRecord table to a branch list partitioned
+    table, run inside a transaction during a maintenance window. Nothing
+    references BorrowRecord with a foreign key, so the table is rebuilt and
+    swapped; the primary key becomes (id, branch_id) as postgres requires.
+    Needs postgres 17+, older versions don't allow identity columns on a
+    partitioned table.
+    """
+    old = f'{BORROW_TABLE}_unpartitioned'
+    cursor.execute(f'ALTER TABLE {BORROW_TABLE} RENAME TO {old}')
+    cursor.execute(f'''
+        CREATE TABLE {BORROW_TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY)
+        PARTITION BY LIST (branch_id)
+    ''')
+    cursor.execute(f'CREATE TABLE {BORROW_TABLE}_default PARTITION OF {BORROW_TABLE} DEFAULT')
+    for branch_id in branch_ids:
+        cursor.execute(
+            f'CREATE TABLE {branch_partition_name(branch_id)} PARTITION OF {BORROW_TABLE} FOR VALUES IN (%s)',
+            [branch_id],
+        )
+    cursor.execute(f'INSERT INTO {BORROW_TABLE} SELECT * FROM {old}')
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {BORROW_TABLE}')
+    cursor.execute(f'ALTER TABLE {BORROW_TABLE} ALTER COLUMN id RESTART WITH {cursor.fetchone()[0]}')
+    cursor.execute(f'DROP TABLE {old}')  # frees the index and constraint names reused below
+    cursor.execute(f'ALTER TABLE {BORROW_TABLE} ADD PRIMARY KEY (id, branch_id)')
+    # indexes declared on the parent are created on every partition
+    cursor.execute(f'CREATE INDEX borrow_record_date_idx ON {BORROW_TABLE} (borrow_date)')
+    cursor.execute(f'CREATE INDEX borrow_branch_member_idx ON {BORROW_TABLE} (branch_id, member_id)')
+    cursor.execute(f'CREATE INDEX borrow_branch_date_idx ON {BORROW_TABLE} (branch_id, borrow_date)')
+    cursor.execute(f'CREATE INDEX {BORROW_TABLE}_book_id ON {BORROW_TABLE} (book_id)')
+    cursor.execute(f'CREATE INDEX {BORROW_TABLE}_member_id ON {BORROW_TABLE} (member_id)')
+    for column, target in [('book_id', 'library_book'), ('member_id', 'users_customuser'), ('branch_id', 'users_branch')]:
+        cursor.execute(
+            f'ALTER TABLE {BORROW_TABLE} ADD CONSTRAINT {BORROW_TABLE}_{column}_fk '
+            f'FOREIGN KEY ({column}) REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+def ensure_branch_partitions(cursor, branch_ids):
+    """
+    Give every branch its own partition. Loans of a branch created before its
+    partition existed sit in the default partition; they are moved across
+    before the new partition is attached, otherwise ATTACH rejects the overlap.
+    """
+    created = []
+    default = f'{BORROW_TABLE}_default'
+    for branch_id in branch_ids:
+        name = branch_partition_name(branch_id)
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            continue
+        cursor.execute(f'CREATE TABLE {name} (LIKE {BORROW_TABLE} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE branch_id = %s RETURNING *) INSERT INTO {name} SELECT * FROM moved',
+            [branch_id],
+        )
+        cursor.execute(f'ALTER TABLE {BORROW_TABLE} ATTACH PARTITION {name} FOR VALUES IN (%s)', [branch_id])
+        created.append(name)
+    return created
@@ -0,0 +1,79 @@
+# library/query_budget.py
+# per-view query count / latency budgets, checked by `manage.py check_query_budgets`
+import gc
+import re
+import time
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudget:
+    """
+    Maximum number of SQL queries (and optionally milliseconds) one GET may take.
+    - params: query string the runner sends, for endpoints that need one (e.g. ?q=)
+    - role: role of the seeded user the request is made as
+    """
+    def __init__(self, queries, ms=None, params=None, role='librarian'):
+        self.queries = queries
+        self.ms = ms
+        self.params = params or {}
+        self.role = role
+
+    def __repr__(self):
+        return f"QueryBudget(queries={self.queries}, ms={self.ms})"
+
+
+def query_budget(queries, ms=None, params=None, role='librarian'):
+    """
+    Declare a budget on a function view, apply it above @api_view.
+    """
+    def decorator(view):
+        view.query_budget = QueryBudget(queries, ms, params, role)
+        return view
+    return decorator
+
+
+class Measurement:
+    def __init__(self, label, budget):
+        self.label = label
+        self.budget = budget
+        self.runs = {}  # dataset size -> (status, queries, ms, [sql])
+
+    def record(self, size, status, captured, ms):
+        self.runs[size] = (status, len(captured), ms, [query['sql'] for query in captured])
+
+    def problems(self):
+        problems = []
+        sizes = sorted(self.runs)
+        for size in sizes:
+            status, queries, ms, _ = self.runs[size]
+            if status >= 400:
+                problems.append(f"HTTP {status} with {size} rows")
+            if queries > self.budget.queries:
+                problems.append(f"{queries} queries with {size} rows, budget {self.budget.queries}")
+            if self.budget.ms is not None and ms > self.budget.ms:
+                problems.append(f"{ms:.1f}ms with {size} rows, budget {self.budget.ms}ms")
+        if len(sizes) > 1 and self.runs[sizes[-1]][1] > self.runs[sizes[0]][1]:
+            problems.append(
+                f"query count grows with data: {self.runs[sizes[0]][1]} -> {self.runs[sizes[-1]][1]} (likely N+1)"
+            )
+        return problems
+
+    def repeated_sql(self, limit=3):
+        """
+        Most repeated statements of the largest run, literals masked so N+1 loops group together.
+        """
+        _, _, _, statements = self.runs[max(self.runs)]
+        shapes = Counter(re.sub(r"\b\d+\b|'[^']*'", '?', sql) for sql in statements)
+        return shapes.most_common(limit)
+
+
+def measure(client, url, params):
+    gc.collect()  # a collector pause inside the timed request would be charged to the view
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        response = client.get(url, params)
+        ms = (time.perf_counter() - started) * 1000
+    return response.status_code, captured.captured_queries, ms
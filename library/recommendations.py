@@ -0,0 +1,133 @@
+# library/recommendations.py
+# "members also borrowed": co-occurrence counts over borrow history, top-K per book
+from collections import Counter, defaultdict
+from heapq import nsmallest
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .models import ArchivedBorrowRecord, BookNeighbour, BorrowRecord, CoBorrowCount, RecommendationBuild
+
+
+def _history(**filters):
+    """
+    (member_id, book_id) pairs from live and archived loans.
+    """
+    for model in (BorrowRecord, ArchivedBorrowRecord):
+        yield from model.objects.filter(**filters).values_list('member_id', 'book_id').iterator(chunk_size=5000)
+
+
+def _top_k(counts, k):
+    # highest count first, lower book id breaks ties so ranks are stable between runs
+    return nsmallest(k, counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _write_neighbours(top_k_by_book):
+    BookNeighbour.objects.bulk_create(
+        [
+            BookNeighbour(book_id=book_id, related_id=other_id, score=score, rank=rank)
+            for book_id, top in top_k_by_book.items()
+            for rank, (other_id, score) in enumerate(top, start=1)
+        ],
+        batch_size=2000,
+    )
+
+
+def _watermark():
+    live = BorrowRecord.objects.aggregate(last=Max('id'))['last'] or 0
+    archived = ArchivedBorrowRecord.objects.aggregate(last=Max('id'))['last'] or 0
+    return max(live, archived)
+
+
+def build_full(k=None):
+    """
+    Rebuild the whole matrix in memory from every member's set of borrowed books.
+    """
+    k = k or getattr(settings, 'RECOMMENDATION_TOP_K', 10)
+    watermark = _watermark()
+    baskets = defaultdict(set)
+    for member_id, book_id in _history(id__lte=watermark):
+        baskets[member_id].add(book_id)
+
+    matrix = defaultdict(Counter)
+    for books in baskets.values():
+        for book_id in books:
+            row = matrix[book_id]
+            for other_id in books:
+                if other_id != book_id:
+                    row[other_id] += 1
+
+    with transaction.atomic():
+        CoBorrowCount.objects.all().delete()
+        CoBorrowCount.objects.bulk_create(
+            (CoBorrowCount(book_id=book_id, other_id=other_id, count=count)
+             for book_id, row in matrix.items() for other_id, count in row.items()),
+            batch_size=5000,
+        )
+        BookNeighbour.objects.all().delete()
+        _write_neighbours({book_id: _top_k(row, k) for book_id, row in matrix.items()})
+        RecommendationBuild.objects.create(last_borrow_record_id=watermark, full=True)
+    return len(matrix)
+
+
+def build_incremental(k=None):
+    """
+    Fold BorrowRecords newer than the last build into the counts and refresh
+    the top-K lists of only the books they touch.
+    """
+    k = k or getattr(settings, 'RECOMMENDATION_TOP_K', 10)
+    last_build = RecommendationBuild.objects.order_by('-id').first()
+    if last_build is None:
+        return build_full(k)
+    since = last_build.last_borrow_record_id
+    watermark = _watermark()
+    new_loans = list(
+        BorrowRecord.objects.filter(id__gt=since, id__lte=watermark).order_by('id').values_list('member_id', 'book_id')
+    )
+    if not new_loans:
+        return 0
+
+    members = {member_id for member_id, _ in new_loans}
+    baskets = defaultdict(set)
+    for member_id, book_id in _history(member_id__in=members, id__lte=since):
+        baskets[member_id].add(book_id)
+
+    deltas = Counter()
+    for member_id, book_id in new_loans:
+        books = baskets[member_id]
+        if book_id in books:
+            continue  # re-borrowing a title doesn't add co-occurrences
+        for other_id in books:
+            deltas[(book_id, other_id)] += 1
+            deltas[(other_id, book_id)] += 1
+        books.add(book_id)
+
+    affected = {book_id for book_id, _ in deltas}
+    with transaction.atomic():
+        existing = {
+            (row.book_id, row.other_id): row
+            for row in CoBorrowCount.objects.select_for_update().filter(book_id__in=affected)
+        }
+        created = []
+        for pair, delta in deltas.items():
+            row = existing.get(pair)
+            if row is None:
+                created.append(CoBorrowCount(book_id=pair[0], other_id=pair[1], count=delta))
+            else:
+                row.count += delta
+        CoBorrowCount.objects.bulk_update(
+            [existing[pair] for pair in deltas if pair in existing], ['count'], batch_size=5000
+        )
+        CoBorrowCount.objects.bulk_create(created, batch_size=5000)
+        top_k_by_book = {}
+        for book_id in affected:
+            top_k_by_book[book_id] = list(
+                CoBorrowCount.objects.filter(book_id=book_id)
+                .order_by('-count', 'other_id')
+                .values_list('other_id', 'count')[:k]
+            )
+        BookNeighbour.objects.filter(book_id__in=affected).delete()
+        _write_neighbours(top_k_by_book)
+        RecommendationBuild.objects.create(last_borrow_record_id=watermark)
+    return len(affected)
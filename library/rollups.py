@@ -0,0 +1,98 @@
+# library/rollups.py
+# incrementally maintained daily circulation rollups behind the /analytics/ endpoints
+import datetime
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import (
+    ArchivedBorrowRecord, BorrowRecord, DailyActiveMembers, DailyBranchActiveMembers, DailyCategoryBorrows,
+    DailyTitleBorrows,
+)
+
+
+def _increment(model, field, **lookup):
+    # UPDATE ... SET n = n + 1 first, the row usually exists already
+    if model.objects.filter(**lookup).update(**{field: F(field) + 1}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **{field: 1})
+    except IntegrityError:  # created concurrently by another request
+        model.objects.filter(**lookup).update(**{field: F(field) + 1})
+
+
+def record_borrow(borrow_record):
+    """
+    Fold one new BorrowRecord into the rollups, called from post_save in the borrow transaction.
+    """
+    day = borrow_record.borrow_date
+    book = borrow_record.book
+    _increment(DailyCategoryBorrows, 'borrows', day=day, branch_id=book.branch_id, category=book.category)
+    _increment(DailyTitleBorrows, 'borrows', day=day, book_id=borrow_record.book_id)
+    earlier_today = BorrowRecord.objects.filter(
+        member_id=borrow_record.member_id, borrow_date=day,
+    ).exclude(pk=borrow_record.pk)
+    if not earlier_today.exists():
+        _increment(DailyActiveMembers, 'active_members', day=day)
+    if not earlier_today.filter(branch_id=book.branch_id).exists():
+        _increment(DailyBranchActiveMembers, 'active_members', day=day, branch_id=book.branch_id)
+
+
+def rebuild_days(start, end):
+    """
+    Recompute the rollups for start <= day < end from live and archived loans.
+    """
+    categories = Counter()
+    titles = Counter()
+    members = defaultdict(set)
+    branch_members = defaultdict(set)
+    for model in (BorrowRecord, ArchivedBorrowRecord):
+        loans = model.objects.filter(borrow_date__gte=start, borrow_date__lt=end)
+        for row in loans.values('borrow_date', 'book__branch_id', 'book__category').annotate(n=Count('id')):
+            categories[(row['borrow_date'], row['book__branch_id'], row['book__category'])] += row['n']
+        for row in loans.values('borrow_date', 'book_id').annotate(n=Count('id')):
+            titles[(row['borrow_date'], row['book_id'])] += row['n']
+        for day, branch_id, member_id in loans.values_list('borrow_date', 'book__branch_id', 'member_id').distinct():
+            members[day].add(member_id)
+            branch_members[(day, branch_id)].add(member_id)
+
+    with transaction.atomic():
+        for model in (DailyCategoryBorrows, DailyTitleBorrows, DailyActiveMembers, DailyBranchActiveMembers):
+            model.objects.filter(day__gte=start, day__lt=end).delete()
+        DailyCategoryBorrows.objects.bulk_create(
+            [
+                DailyCategoryBorrows(day=day, branch_id=branch_id, category=category, borrows=n)
+                for (day, branch_id, category), n in categories.items()
+            ],
+            batch_size=2000,
+        )
+        DailyTitleBorrows.objects.bulk_create(
+            [DailyTitleBorrows(day=day, book_id=book_id, borrows=n) for (day, book_id), n in titles.items()],
+            batch_size=2000,
+        )
+        DailyActiveMembers.objects.bulk_create(
+            [DailyActiveMembers(day=day, active_members=len(ids)) for day, ids in members.items()],
+            batch_size=2000,
+        )
+        DailyBranchActiveMembers.objects.bulk_create(
+            [
+                DailyBranchActiveMembers(day=day, branch_id=branch_id, active_members=len(ids))
+                for (day, branch_id), ids in branch_members.items()
+            ],
+            batch_size=2000,
+        )
+    return sum(categories.values())
+
+
+def backfill(start, end, chunk_days=30):
+    """
+    Rebuild start <= day <= end in chunks of `chunk_days`, yielding (chunk_start, chunk_end, loans).
+    """
+    chunk = datetime.timedelta(days=chunk_days)
+    stop = end + datetime.timedelta(days=1)
+    while start < stop:
+        chunk_end = min(start + chunk, stop)
+        yield start, chunk_end, rebuild_days(start, chunk_end)
+        start = chunk_end
@@ -1,15 +1,81 @@
 from rest_framework import serializers
-from .models import Author, Book, BorrowRecord
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from .models import Author, Book, BorrowRecord, CirculationEvent, DeletionJob
+from .utils import normalize_isbn
+from .covers import thumbnail_urls
 
 class AuthorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Author
-        fields = ['id', 'name', 'biography']
+        fields = ['id', 'name', 'biography', 'updated_at']
 
 class BookSerializer(serializers.ModelSerializer):
+    # accepts ISBN-10, hyphenated ISBN-13 and EAN input, stored normalized to 13 digits
+    ISBN = serializers.CharField(max_length=17)
+    # precomputed storage names, no file access or extra query per book
+    thumbnails = serializers.SerializerMethodField(help_text="Cover thumbnail urls by size, empty until rendered")
+
     class Meta:
         model = Book
-        fields = ['id', 'title', 'author', 'ISBN', 'category', 'availability_status']
+        fields = ['id', 'title', 'author', 'ISBN', 'category', 'availability_status', 'branch', 'cover', 'thumbnails', 'updated_at']
+        read_only_fields = ['cover']
+        extra_kwargs = {'branch': {'required': False}}
+
+    def get_thumbnails(self, book):
+        return thumbnail_urls(book, self.context.get('request'))
+
+    def validate_ISBN(self, value):
+        try:
+            isbn = normalize_isbn(value)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+        books = Book.objects.filter(ISBN=isbn)
+        if self.instance is not None:
+            books = books.exclude(pk=self.instance.pk)
+        if books.exists():
+            raise serializers.ValidationError("A book with this ISBN already exists.")
+        return isbn
+
+    def validate(self, attrs):
+        # branch staff catalogue into their own branch, unscoped users pick one
+        request = self.context.get('request')
+        branch_id = getattr(request.user, 'branch_id', None) if request else None
+        if branch_id is not None:
+            attrs.pop('branch', None)
+            attrs['branch_id'] = branch_id
+        elif self.instance is None and not attrs.get('branch'):
+            raise serializers.ValidationError({'branch': "This field is required."})
+        return attrs
+
+
+class RelatedBookSerializer(serializers.Serializer):
+    score = serializers.IntegerField(help_text="Members who borrowed both books")
+    book = BookSerializer(source='related')
+
+
+class CoverUploadSerializer(serializers.Serializer):
+    image = serializers.ImageField(help_text="JPEG, PNG or WebP cover image")
+
+    def validate_image(self, value):
+        limit = getattr(settings, 'COVER_MAX_UPLOAD_BYTES', 5 * 1024 * 1024)
+        if value.size > limit:
+            raise serializers.ValidationError(f"Cover images can be at most {limit // (1024 * 1024)} MB.")
+        return value
+
+
+class IsbnLookupSerializer(serializers.Serializer):
+    isbns = serializers.ListField(
+        child=serializers.CharField(max_length=32),
+        allow_empty=False,
+        help_text="List of ISBN-10, ISBN-13 or EAN codes to resolve",
+    )
+
+    def validate_isbns(self, value):
+        limit = getattr(settings, 'ISBN_LOOKUP_LIMIT', 500)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} ISBNs can be looked up at once.")
+        return value
 """
 class MemberSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,7 +87,51 @@ class BorrowRecordSerializer(serializers.ModelSerializer):
     member = serializers.PrimaryKeyRelatedField(read_only=True)  # Or use a nested serializer
     class Meta:
         model = BorrowRecord
-        fields = ['id', 'book', 'member', 'borrow_date', 'return_date']
+        fields = ['id', 'book', 'member', 'branch', 'borrow_date', 'return_date', 'updated_at']
+
+
+class BorrowHistorySerializer(serializers.Serializer):
+    """
+    Read-only rows of the merged live + archived borrow history (?include_archived=true).
+    """
+    id = serializers.IntegerField()
+    book = serializers.IntegerField(source='book_id')
+    member = serializers.IntegerField(source='member_id')
+    branch = serializers.IntegerField(source='branch_id', allow_null=True)
+    borrow_date = serializers.DateField()
+    return_date = serializers.DateField()
+    archived = serializers.BooleanField()
+
+
+class CirculationEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CirculationEvent
+        fields = ['id', 'event_type', 'occurred_at', 'book', 'member', 'borrow_record_id']
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'model', 'object_id', 'branch', 'status', 'deleted_rows', 'error', 'created_at', 'finished_at']
+
+
+class BatchEntrySerializer(serializers.Serializer):
+    id = serializers.CharField(max_length=100, required=False, help_text="Echoed back to match responses, defaults to the position")
+    url = serializers.CharField(max_length=2000, help_text="Relative GET url, e.g. /books/?page=2")
+    headers = serializers.DictField(
+        child=serializers.CharField(max_length=200), required=False,
+        help_text="Only If-None-Match and If-Modified-Since are forwarded",
+    )
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchEntrySerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        limit = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} requests can be batched at once.")
+        return value
 
 
 class BorrowSerializer(serializers.Serializer):
@@ -0,0 +1,73 @@
+# library/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.db import transaction
+from .models import Author, Book, BorrowRecord, SyncChange
+from users.models import CustomUser
+from . import autocomplete, covers, rollups
+
+
+# keep the in-process typeahead indexes in step with catalog writes
+@receiver(post_save, sender=Book)
+def index_book_title(sender, instance, **kwargs):
+    if instance.pending_deletion:
+        autocomplete.book_titles.remove(instance.pk)  # e.g. the thumbnail save of a hidden book
+    else:
+        autocomplete.book_titles.update(instance.pk, instance.title, instance.branch_id)
+
+@receiver(post_delete, sender=Book)
+def unindex_book_title(sender, instance, **kwargs):
+    autocomplete.book_titles.remove(instance.pk)
+
+@receiver(post_save, sender=Author)
+def index_author_name(sender, instance, **kwargs):
+    if instance.pending_deletion:
+        autocomplete.author_names.remove(instance.pk)
+    else:
+        autocomplete.author_names.update(instance.pk, instance.name)
+
+@receiver(post_delete, sender=Author)
+def unindex_author_name(sender, instance, **kwargs):
+    autocomplete.author_names.remove(instance.pk)
+
+
+# change feed for /sync/changes/
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BorrowRecord)
+def record_sync_change(sender, instance, **kwargs):
+    SyncChange.record(instance)
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=BorrowRecord)
+def record_sync_tombstone(sender, instance, **kwargs):
+    SyncChange.record(instance, deleted=True)
+
+
+# open loan counter; borrow/return and edits adjust it explicitly, raw deletes (purge, archive) skip this
+@receiver(post_delete, sender=BorrowRecord)
+def release_open_loan(sender, instance, **kwargs):
+    if instance.return_date is None:
+        CustomUser.adjust_open_loans(instance.member_id, -1)
+
+
+# daily analytics rollups
+@receiver(post_save, sender=BorrowRecord)
+def rollup_borrow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        rollups.record_borrow(instance)
+
+
+# cover thumbnails, rendered after the new cover is committed
+@receiver(post_save, sender=Book)
+def render_cover_thumbnails(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or not instance.cover:
+        return
+    if update_fields is not None and 'cover' not in update_fields:
+        return
+    if update_fields is None and not created and instance.cover.name == getattr(instance, '_loaded_cover', None):
+        return  # e.g. the availability saves of borrow/return
+    if instance.cover_thumbnails.get('source') != instance.cover.name:
+        transaction.on_commit(lambda: covers.schedule(instance))
+    instance._loaded_cover = instance.cover.name
@@ -1,3 +1,772 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import shutil
+import tempfile
+import sys
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import AnonymousUser
+from django.apps import apps
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import clear_url_caches, get_resolver
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from library_management import docs
+from library_management.middleware import (
+    LeanAuthenticationMiddleware, LeanCsrfViewMiddleware, LeanMessageMiddleware, LeanSessionMiddleware,
+)
+from users.models import Branch, CustomUser
+from . import autocomplete, deletion, events, recommendations
+from library_management.warmup import warm_up
+from .models import ArchivedBorrowRecord, Author, Book, BookNeighbour, BorrowRecord, CoBorrowCount, SyncChange
+from .utils import decode_sync_cursor, normalize_isbn
+
+
+class LibraryTestCase(APITestCase):
+    """
+    Two branches, a librarian of the first one, two members and a small catalog.
+    """
+    def setUp(self):
+        cache.clear()  # throttle counters
+        for index in (autocomplete.book_titles, autocomplete.author_names):
+            index.reset()
+        self.branch = Branch.objects.create(name='Central', code='central')
+        self.other_branch = Branch.objects.create(name='Harbour', code='harbour')
+        self.librarian = CustomUser.objects.create(username='librarian', email='librarian@example.com', role='librarian', branch=self.branch)
+        self.admin = CustomUser.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.member = CustomUser.objects.create(username='member', email='member@example.com', role='member', branch=self.branch)
+        self.other_member = CustomUser.objects.create(username='other', email='other@example.com', role='member', branch=self.branch)
+        self.author = Author.objects.create(name='George Orwell', biography='-')
+        self.book = Book.objects.create(title='1984', author=self.author, ISBN='978-0451524935', category='Dystopian', branch=self.branch)
+        self.second_book = Book.objects.create(title='Animal Farm', author=self.author, ISBN='0-306-40615-2', category='Satire', branch=self.branch)
+
+    def login(self, user):
+        self.client.force_authenticate(user)
+
+    def borrow(self, user, book):
+        self.login(user)
+        return self.client.post('/library/borrow/', {'book': book.pk})
+
+
+class IsbnTests(LibraryTestCase):
+    def test_normalize_isbn(self):
+        self.assertEqual(normalize_isbn('0-306-40615-2'), '9780306406157')
+        self.assertEqual(normalize_isbn('978-0-306-40615-7'), '9780306406157')
+        self.assertEqual(normalize_isbn('080442957X'), '9780804429573')
+        for bad in ['0-306-40615-3', '4006381333931', '12345']:
+            with self.assertRaises(ValidationError):
+                normalize_isbn(bad)
+
+    def test_stored_normalized(self):
+        self.assertEqual(self.book.ISBN, '9780451524935')
+        self.assertEqual(self.second_book.ISBN, '9780306406157')
+
+    def test_create_rejects_duplicate_in_other_form(self):
+        self.login(self.librarian)
+        response = self.client.post('/books/', {'title': 'Copy', 'author': self.author.pk, 'ISBN': '0451524934', 'category': 'Dystopian'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ISBN', response.data)
+
+    def test_by_isbn_get(self):
+        self.login(self.member)
+        response = self.client.get('/books/by-isbn/', {'isbn': '0-306-40615-2,9780451524935,9780000000002,9780000000001,abc'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {row['query']: row['book']['id'] for row in response.data['results']},
+            {'0-306-40615-2': self.second_book.pk, '9780451524935': self.book.pk},
+        )
+        self.assertEqual(response.data['not_found'], ['9780000000002'])
+        self.assertEqual(response.data['invalid'], ['9780000000001', 'abc'])
+
+    def test_by_isbn_post_scoped_to_branch(self):
+        Book.objects.create(title='Elsewhere', author=self.author, ISBN='9780747532699', category='Fantasy', branch=self.other_branch)
+        self.login(self.member)
+        response = self.client.post('/books/by-isbn/', {'isbns': ['0747532699', '0451524934']}, format='json')
+        self.assertEqual([row['book']['id'] for row in response.data['results']], [self.book.pk])
+        self.assertEqual(response.data['not_found'], ['0747532699'])
+
+
+@override_settings(SYNC_SAFETY_LAG_SECONDS=0, AUTOCOMPLETE_SYNC_SECONDS=0)
+class AutocompleteTests(LibraryTestCase):
+    def test_writes_from_other_workers_are_picked_up(self):
+        self.assertEqual(autocomplete.book_titles.search('anim'), [{'id': self.second_book.pk, 'label': 'Animal Farm'}])
+        # another worker's writes only reach this process through the change feed
+        Book.objects.filter(pk=self.book.pk).update(title='Nineteen Eighty-Four')
+        Book.objects.filter(pk=self.second_book.pk).update(pending_deletion=True)
+        for book in Book.objects.filter(pk__in=[self.book.pk, self.second_book.pk]):
+            SyncChange.record(book, deleted=book.pending_deletion)
+        self.assertEqual(autocomplete.book_titles.search('anim'), [])
+        self.assertEqual(autocomplete.book_titles.search('eigh'), [{'id': self.book.pk, 'label': 'Nineteen Eighty-Four'}])
+
+    @override_settings(AUTOCOMPLETE_SYNC_SECONDS=60)
+    def test_feed_checked_at_most_every_interval(self):
+        autocomplete.book_titles.search('anim')
+        with self.assertNumQueries(0):
+            autocomplete.book_titles.search('19')
+
+    def test_saving_a_hidden_book_keeps_it_out(self):
+        autocomplete.book_titles.search('anim')
+        Book.objects.filter(pk=self.second_book.pk).update(pending_deletion=True)
+        autocomplete.book_titles.remove(self.second_book.pk)
+        book = Book.objects.get(pk=self.second_book.pk)
+        book.save(update_fields=['cover_thumbnails'])
+        self.assertEqual(autocomplete.book_titles.search('anim'), [])
+
+    def test_full_index_logs_dropped_labels(self):
+        index = autocomplete.PrefixIndex(lambda: [(1, 'Animal Farm', None), (2, 'Brave New World', None)], max_entries=2)
+        with self.assertLogs('library.autocomplete', 'WARNING') as logs:
+            self.assertEqual(index.search('brave'), [])
+        self.assertIn('1 labels left out', logs.output[0])
+        self.assertEqual(index.search('farm'), [{'id': 1, 'label': 'Animal Farm'}])
+
+
+@override_settings(LOAN_LIMITS={'member': 1, 'librarian': 20})
+class LoanLimitTests(LibraryTestCase):
+    def open_loans(self, user):
+        return CustomUser.objects.get(pk=user.pk).open_loans
+
+    def test_borrow_and_return_move_the_counter(self):
+        response = self.borrow(self.member, self.book)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.open_loans(self.member), 1)
+        response = self.client.post('/library/return/', {'borrow_record_id': response.data['id']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.open_loans(self.member), 0)
+        response = self.client.post('/library/return/', {'borrow_record_id': response.data['id']})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.open_loans(self.member), 0)
+
+    def test_limit_reached(self):
+        self.assertEqual(self.borrow(self.member, self.book).status_code, 201)
+        response = self.borrow(self.member, self.second_book)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Loan limit', response.data['error'])
+        self.assertTrue(Book.objects.get(pk=self.second_book.pk).availability_status)
+        self.assertEqual(self.open_loans(self.member), 1)
+
+    def test_per_user_limit_overrides_role(self):
+        self.member.loan_limit = 2
+        self.member.save(update_fields=['loan_limit'])
+        self.assertEqual(self.borrow(self.member, self.book).status_code, 201)
+        self.assertEqual(self.borrow(self.member, self.second_book).status_code, 201)
+
+    def test_librarian_edit_and_delete(self):
+        record_id = self.borrow(self.member, self.book).data['id']
+        self.login(self.librarian)
+        response = self.client.patch(f'/borrow-records/{record_id}/', {'return_date': timezone.now().date().isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.open_loans(self.member), 0)
+        self.client.patch(f'/borrow-records/{record_id}/', {'return_date': None}, format='json')
+        self.assertEqual(self.open_loans(self.member), 1)
+        self.assertEqual(self.client.delete(f'/borrow-records/{record_id}/').status_code, 204)
+        self.assertEqual(self.open_loans(self.member), 0)
+
+    def test_user_updates_keep_the_counter(self):
+        self.borrow(self.member, self.book)
+        stale = CustomUser.objects.get(pk=self.member.pk)
+        CustomUser.adjust_open_loans(self.member.pk, 1)
+        stale.mobile_no = '555'
+        stale.save(update_fields=['mobile_no'])
+        self.login(self.admin)
+        self.assertEqual(self.client.patch(f'/users/{self.member.pk}/', {'mobile_no': '556'}).status_code, 200)
+        self.assertEqual(self.client.patch(f'/users/{self.member.pk}/update_role/', {'role': 'member'}).status_code, 200)
+        self.assertEqual(self.open_loans(self.member), 2)
+
+    def test_reconcile_open_loans(self):
+        self.borrow(self.member, self.book)
+        CustomUser.objects.filter(pk=self.member.pk).update(open_loans=5)
+        call_command('reconcile_open_loans', '--fix', stdout=StringIO())
+        self.assertEqual(self.open_loans(self.member), 1)
+
+
+class CirculationEventTests(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.elsewhere = Book.objects.create(title='Elsewhere', author=self.author, ISBN='9780747532699', category='Fantasy', branch=self.other_branch)
+        loan = self.borrow(self.member, self.book).data
+        self.client.post('/library/return/', {'borrow_record_id': loan['id']})
+        self.borrow(self.other_member, self.second_book)
+        self.borrow(self.other_member, self.elsewhere)
+
+    def events(self, user, **params):
+        self.login(user)
+        response = self.client.get('/circulation-events/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['event_type'], row['book'], row['member']) for row in response.data['results']]
+
+    def test_borrow_and_return_are_logged(self):
+        self.assertEqual(self.events(self.member), [('return', self.book.pk, self.member.pk), ('borrow', self.book.pk, self.member.pk)])
+
+    def test_librarian_sees_their_branch(self):
+        self.assertEqual(len(self.events(self.librarian)), 3)
+        self.assertEqual(len(self.events(self.admin)), 0)  # admins aren't served the log
+        self.assertEqual(self.events(self.librarian, member=self.other_member.pk), [('borrow', self.second_book.pk, self.other_member.pk)])
+        self.assertEqual([event[0] for event in self.events(self.librarian, book=self.book.pk)], ['return', 'borrow'])
+
+    def test_time_window(self):
+        now = timezone.now()
+        self.assertEqual(len(self.events(self.librarian, since=(now - datetime.timedelta(hours=1)).isoformat())), 3)
+        self.assertEqual(self.events(self.librarian, until=timezone.localdate().isoformat()), [])
+        self.assertEqual(self.events(self.librarian, since=(timezone.localdate() + datetime.timedelta(days=1)).isoformat()), [])
+
+
+class BorrowHistoryTests(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.now().date()
+        self.live = BorrowRecord.objects.create(book=self.book, member=self.member)
+        ArchivedBorrowRecord.objects.create(
+            id=10 ** 6, book=self.second_book, member=self.member, branch=self.branch,
+            borrow_date=today - datetime.timedelta(days=400), return_date=today - datetime.timedelta(days=390),
+        )
+        ArchivedBorrowRecord.objects.create(
+            id=10 ** 6 + 1, book=self.book, member=self.other_member, branch=self.branch,
+            borrow_date=today - datetime.timedelta(days=500), return_date=today - datetime.timedelta(days=490),
+        )
+
+    def test_include_archived_newest_first(self):
+        self.login(self.librarian)
+        response = self.client.get('/borrow-records/', {'include_archived': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [10 ** 6 + 1, 10 ** 6, self.live.pk])
+        self.assertEqual([row['archived'] for row in response.data['results']], [True, True, False])
+
+    def test_include_archived_with_ordering(self):
+        self.login(self.librarian)
+        response = self.client.get('/borrow-records/', {'include_archived': 'true', 'ordering': 'borrow_date'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [10 ** 6 + 1, 10 ** 6, self.live.pk])
+        response = self.client.get('/borrow-records/', {'include_archived': 'true', 'ordering': '-borrow_date,title'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.live.pk, 10 ** 6, 10 ** 6 + 1])
+
+    def test_member_sees_own_history(self):
+        self.login(self.member)
+        response = self.client.get('/borrow-records/', {'include_archived': 'true'})
+        self.assertEqual([row['id'] for row in response.data['results']], [10 ** 6, self.live.pk])
+
+
+@override_settings(SYNC_SAFETY_LAG_SECONDS=0)
+class SyncTests(LibraryTestCase):
+    def sync(self, user, since=None):
+        self.login(user)
+        response = self.client.get('/sync/changes/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_full_then_delta(self):
+        data = self.sync(self.member)
+        self.assertEqual({row['id'] for row in data['changes']['books']}, {self.book.pk, self.second_book.pk})
+        self.assertFalse(data['has_more'])
+        self.book.title = 'Nineteen Eighty-Four'
+        self.book.save()
+        delta = self.sync(self.member, data['cursor'])
+        self.assertEqual([row['title'] for row in delta['changes']['books']], ['Nineteen Eighty-Four'])
+        self.assertEqual(delta['changes']['authors'], [])
+        self.assertEqual(self.sync(self.member, delta['cursor'])['changes']['books'], [])
+
+    def test_member_scoping_and_tombstones(self):
+        cursor = self.sync(self.member)['cursor']
+        mine = BorrowRecord.objects.create(book=self.book, member=self.member)
+        theirs = BorrowRecord.objects.create(book=self.second_book, member=self.other_member)
+        data = self.sync(self.member, cursor)
+        self.assertEqual([row['id'] for row in data['changes']['borrow_records']], [mine.pk])
+        mine_id, theirs_id = mine.pk, theirs.pk
+        mine.delete()
+        theirs.delete()
+        data = self.sync(self.member, data['cursor'])
+        self.assertEqual(data['deleted']['borrow_records'], [mine_id])
+        librarian = self.sync(self.librarian, cursor)
+        self.assertEqual(sorted(librarian['deleted']['borrow_records']), sorted([mine_id, theirs_id]))
+
+    def test_purge_tombstones_reach_the_member(self):
+        record = BorrowRecord.objects.create(book=self.book, member=self.member)
+        cursor = self.sync(self.member)['cursor']
+        job = deletion.schedule(self.book, self.librarian)
+        deletion.run(job)
+        data = self.sync(self.member, cursor)
+        self.assertEqual(data['deleted']['borrow_records'], [record.pk])
+        self.assertEqual(data['deleted']['books'], [self.book.pk])
+
+    def test_archiving_writes_no_tombstones(self):
+        record = BorrowRecord.objects.create(book=self.book, member=self.member)
+        BorrowRecord.objects.filter(pk=record.pk).update(
+            borrow_date=timezone.now().date() - datetime.timedelta(days=800),
+            return_date=timezone.now().date() - datetime.timedelta(days=790),
+        )
+        cursor = self.sync(self.member)['cursor']
+        call_command('archive_borrow_records', stdout=StringIO())
+        self.assertTrue(ArchivedBorrowRecord.objects.filter(pk=record.pk).exists())
+        self.assertFalse(BorrowRecord.objects.filter(pk=record.pk).exists())
+        self.assertEqual(self.sync(self.member, cursor)['deleted']['borrow_records'], [])
+        self.assertFalse(SyncChange.objects.filter(model='borrowrecord', object_id=record.pk).exists())
+
+    def test_archiving_moves_the_borrow_record_version(self):
+        BorrowRecord.objects.create(
+            book=self.book, member=self.member,
+            borrow_date=timezone.now().date() - datetime.timedelta(days=800),
+            return_date=timezone.now().date() - datetime.timedelta(days=790),
+        )
+        self.login(self.librarian)
+        views = [{}, {'include_archived': 'true'}]
+        etags = [self.client.get('/borrow-records/', params)['ETag'] for params in views]
+        call_command('archive_borrow_records', stdout=StringIO())
+        for params, etag in zip(views, etags):
+            response = self.client.get('/borrow-records/', params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertTrue(response.data['results'][0]['archived'])
+        # one marker, however many batches ran
+        call_command('archive_borrow_records', '--older-than-days=0', stdout=StringIO())
+        self.assertEqual(SyncChange.objects.filter(model='borrowrecord', object_id=SyncChange.VERSION_MARKER).count(), 1)
+        self.assertEqual(self.sync(self.librarian)['changes']['borrow_records'], [])
+
+    @override_settings(SYNC_SAFETY_LAG_SECONDS=60)
+    def test_recent_changes_held_back(self):
+        SyncChange.objects.update(changed_at=timezone.now() - datetime.timedelta(minutes=5))
+        settled = SyncChange.objects.order_by('-id').values_list('id', flat=True).first()
+        self.book.save()  # a fresh change, may still have a lower id in flight
+        data = self.sync(self.member)
+        self.assertEqual(decode_sync_cursor(data['cursor']), settled)
+        self.assertNotIn(self.book.pk, [row['id'] for row in data['changes']['books']])
+        self.assertFalse(data['has_more'])
+
+    def test_invalid_cursor(self):
+        self.login(self.member)
+        self.assertEqual(self.client.get('/sync/changes/', {'since': 'nope'}).status_code, 400)
+
+
+class AvailabilityStreamTests(LibraryTestCase):
+    async def test_broadcaster_filters_and_drops_oldest(self):
+        broadcaster = events.Broadcaster()
+        everything = broadcaster.subscribe(max_queue=2)
+        fantasy = broadcaster.subscribe(categories={'Fantasy'})
+        harbour = broadcaster.subscribe(branch=self.other_branch.pk)
+        for book in (1, 2, 3):
+            broadcaster.publish({'type': 'borrow', 'book': book, 'category': 'Satire', 'branch': self.branch.pk})
+        await asyncio.sleep(0)  # deliveries are scheduled on the subscriber's loop
+        self.assertEqual([everything.queue.get_nowait()['book'] for _ in range(everything.queue.qsize())], [2, 3])
+        self.assertTrue(fantasy.queue.empty())
+        self.assertTrue(harbour.queue.empty())
+        broadcaster.unsubscribe(everything)
+        self.assertEqual(len(broadcaster), 2)
+
+    async def test_stream(self):
+        response = await self.async_client.get('/events/availability/')
+        self.assertEqual(response.status_code, 401)
+
+        token = AccessToken.for_user(self.member)
+        response = await self.async_client.get('/events/availability/', {'token': str(token), 'books': f'{self.book.pk}'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        # the subscription is made when the stream starts, publish once it is waiting
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        events.publish_availability(self.second_book, 'borrow')  # not followed
+        events.publish_availability(self.book, 'borrow')
+        chunk = await asyncio.wait_for(pending, 5)
+        self.assertTrue(chunk.startswith(b'event: borrow\ndata: '))
+        self.assertEqual(json.loads(chunk.split(b'data: ')[1]), {
+            'type': 'borrow', 'book': self.book.pk, 'category': 'Dystopian', 'branch': self.branch.pk, 'available': True,
+        })
+        # a client disconnect cancels the task reading the stream
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.05)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(len(events.availability), 0)
+
+
+class RelatedBooksTests(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.third_book = Book.objects.create(title='Homage to Catalonia', author=self.author, ISBN='9780747532699', category='Memoir', branch=self.branch)
+        self.elsewhere = Book.objects.create(title='Burmese Days', author=self.author, ISBN='9780804429573', category='Novel', branch=self.other_branch)
+        self.loan(self.member, self.book, self.second_book, self.third_book)
+        self.loan(self.other_member, self.book, self.second_book, self.elsewhere)
+
+    def loan(self, member, *books):
+        for book in books:
+            BorrowRecord.objects.create(book=book, member=member)
+
+    def related(self, user, book):
+        self.login(user)
+        response = self.client.get(f'/books/{book.pk}/related/')
+        self.assertEqual(response.status_code, 200)
+        return [(row['book']['id'], row['score']) for row in response.data]
+
+    def snapshot(self):
+        return (
+            sorted(CoBorrowCount.objects.values_list('book_id', 'other_id', 'count')),
+            sorted(BookNeighbour.objects.values_list('book_id', 'related_id', 'score', 'rank')),
+        )
+
+    def test_related_best_first_within_the_branch(self):
+        recommendations.build_full()
+        self.assertEqual(self.related(self.admin, self.book), [(self.second_book.pk, 2), (self.third_book.pk, 1), (self.elsewhere.pk, 1)])
+        self.assertEqual(self.related(self.member, self.book), [(self.second_book.pk, 2), (self.third_book.pk, 1)])
+        Book.objects.filter(pk=self.second_book.pk).update(pending_deletion=True)
+        self.assertEqual(self.related(self.member, self.book), [(self.third_book.pk, 1)])
+
+    def test_incremental_build_matches_a_full_rebuild(self):
+        recommendations.build_full(k=2)
+        newcomer = CustomUser.objects.create(username='newcomer', email='newcomer@example.com', role='member', branch=self.branch)
+        self.loan(self.member, self.elsewhere, self.book)  # one new pair, one re-borrow
+        self.loan(newcomer, self.third_book, self.elsewhere)
+        self.assertEqual(recommendations.build_incremental(k=2), 4)
+        incremental = self.snapshot()
+        recommendations.build_full(k=2)
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(recommendations.build_incremental(k=2), 0)
+
+
+class ConditionalReadTests(LibraryTestCase):
+    def test_etag_304_and_new_etag_after_write(self):
+        self.login(self.member)
+        response = self.client.get('/books/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/books/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.book.title = 'Changed'
+        self.book.save()
+        response = self.client.get('/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_differs_by_role(self):
+        self.login(self.member)
+        etag = self.client.get(f'/books/{self.book.pk}/')['ETag']
+        self.login(self.librarian)
+        self.assertEqual(self.client.get(f'/books/{self.book.pk}/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified(self):
+        changed_at = SyncChange.objects.filter(model='book').order_by('-id').first().changed_at.timestamp()
+        self.login(self.member)
+        with mock.patch('library.conditional.time.time', return_value=changed_at + 10):
+            response = self.client.get('/books/')
+            self.assertTrue(response.has_header('Last-Modified'))
+            self.assertEqual(self.client.get('/books/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_no_last_modified_within_the_second_of_a_change(self):
+        changed_at = SyncChange.objects.filter(model='book').order_by('-id').first().changed_at.timestamp()
+        self.login(self.member)
+        with mock.patch('library.conditional.time.time', return_value=changed_at):
+            response = self.client.get('/books/')
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertTrue(response.has_header('ETag'))
+
+
+class BatchTests(LibraryTestCase):
+    def test_batch(self):
+        self.login(self.member)
+        etag = self.client.get(f'/books/{self.book.pk}/')['ETag']
+        response = self.client.post('/batch/', {'requests': [
+            {'id': 'books', 'url': '/books/'},
+            {'id': 'book', 'url': f'/books/{self.book.pk}/', 'headers': {'If-None-Match': etag}},
+            {'id': 'missing', 'url': '/nothing-here/'},
+            {'url': 'https://example.com/books/'},
+            {'id': 'records', 'url': '/deletion-jobs/'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = {row['id']: row['status'] for row in response.data['responses']}
+        self.assertEqual(statuses, {'books': 200, 'book': 304, 'missing': 404, '3': 400, 'records': 403})
+        self.assertEqual(response.data['responses'][0]['body']['count'], 2)
+
+    def test_sub_requests_reuse_the_outer_authentication(self):
+        token = AccessToken.for_user(self.member)
+        with mock.patch.object(JWTAuthentication, 'get_validated_token', wraps=JWTAuthentication().get_validated_token) as validate:
+            response = self.client.post('/batch/', {'requests': [
+                {'url': '/books/'}, {'url': '/auth/users/me/'}, {'url': f'/books/{self.book.pk}/related/'},
+            ]}, format='json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual([row['status'] for row in response.data['responses']], [200, 200, 200])
+        self.assertEqual(response.data['responses'][1]['body']['username'], 'member')
+        self.assertEqual(validate.call_count, 1)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_limit(self):
+        self.login(self.member)
+        response = self.client.post('/batch/', {'requests': [{'url': '/books/'}] * 3}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class DeletionTests(LibraryTestCase):
+    def test_author_delete_hides_then_purges(self):
+        BorrowRecord.objects.create(book=self.book, member=self.member)
+        CustomUser.adjust_open_loans(self.member.pk, 1)
+        self.assertEqual(autocomplete.book_titles.search('anim'), [{'id': self.second_book.pk, 'label': 'Animal Farm'}])
+        self.login(self.librarian)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/authors/{self.author.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.client.get(f'/books/{self.book.pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/books/').data['count'], 0)
+        self.assertEqual(autocomplete.book_titles.search('anim'), [])
+
+        call_command('process_deletions', stdout=StringIO())
+        self.assertFalse(Author.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(BorrowRecord.objects.exists())
+        self.assertEqual(CustomUser.objects.get(pk=self.member.pk).open_loans, 0)
+        self.assertEqual(self.client.get(f'/deletion-jobs/{response.data["id"]}/').data['status'], 'done')
+
+    def test_rebuilt_index_skips_pending_deletions(self):
+        deletion.schedule(self.second_book)
+        autocomplete.book_titles.reset()
+        self.assertEqual(autocomplete.book_titles.search('anim'), [])
+        self.assertEqual(len(autocomplete.book_titles.search('19')), 1)
+
+
+class BranchAnalyticsTests(LibraryTestCase):
+    def test_branch_librarian_only_sees_their_branch(self):
+        harbour_book = Book.objects.create(title='Burmese Days', author=self.author, ISBN='9780747532699', category='Satire', branch=self.other_branch)
+        harbour_member = CustomUser.objects.create(username='harbour', email='harbour@example.com', role='member', branch=self.other_branch)
+        BorrowRecord.objects.create(book=self.second_book, member=self.member)
+        BorrowRecord.objects.create(book=harbour_book, member=harbour_member)
+
+        self.login(self.librarian)
+        rows = self.client.get('/analytics/borrows-by-category/').data
+        self.assertEqual([(row['category'], row['borrows']) for row in rows], [('Satire', 1)])
+        self.assertEqual([row['book'] for row in self.client.get('/analytics/top-titles/').data], [self.second_book.pk])
+        self.assertEqual([row['active_members'] for row in self.client.get('/analytics/active-members/').data], [1])
+
+        self.librarian.branch = None
+        self.librarian.save(update_fields=['branch'])
+        rows = self.client.get('/analytics/borrows-by-category/').data
+        self.assertEqual([(row['category'], row['borrows']) for row in rows], [('Satire', 2)])
+        self.assertEqual([row['active_members'] for row in self.client.get('/analytics/active-members/').data], [2])
+
+
+class BranchDeletionTests(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.elsewhere = Book.objects.create(title='Burmese Days', author=self.author, ISBN='9780747532699', category='Novel', branch=self.other_branch)
+        self.head_librarian = CustomUser.objects.create(username='head', email='head@example.com', role='librarian')
+
+    def test_branch_librarian_cannot_delete_an_author_with_books_elsewhere(self):
+        self.login(self.librarian)
+        response = self.client.delete(f'/authors/{self.author.pk}/')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Book.objects.filter(pending_deletion=True).exists())
+        self.login(self.head_librarian)
+        response = self.client.delete(f'/authors/{self.author.pk}/')
+        self.assertEqual((response.status_code, response.data['branch']), (202, None))
+
+    def test_jobs_listed_by_branch(self):
+        self.login(self.head_librarian)
+        self.client.delete(f'/books/{self.elsewhere.pk}/')
+        self.login(self.librarian)
+        response = self.client.delete(f'/books/{self.book.pk}/')
+        self.assertEqual(response.data['branch'], self.branch.pk)
+        self.assertEqual([job['object_id'] for job in self.client.get('/deletion-jobs/').data['results']], [self.book.pk])
+        self.login(self.head_librarian)
+        self.assertEqual(self.client.get('/deletion-jobs/').data['count'], 2)
+
+
+@override_settings(SYNC_SAFETY_LAG_SECONDS=0)
+class BranchSyncTests(LibraryTestCase):
+    def test_feed_scoped_to_the_branch(self):
+        harbour_librarian = CustomUser.objects.create(username='harbour', email='harbour@example.com', role='librarian', branch=self.other_branch)
+        harbour_member = CustomUser.objects.create(username='sailor', email='sailor@example.com', role='member', branch=self.other_branch)
+        elsewhere = Book.objects.create(title='Burmese Days', author=self.author, ISBN='9780747532699', category='Novel', branch=self.other_branch)
+        local_loan = BorrowRecord.objects.create(book=self.book, member=self.member)
+        harbour_loan = BorrowRecord.objects.create(book=elsewhere, member=harbour_member)
+
+        self.login(self.librarian)
+        data = self.client.get('/sync/changes/').data
+        self.assertEqual([row['id'] for row in data['changes']['authors']], [self.author.pk])
+        self.assertEqual({row['id'] for row in data['changes']['books']}, {self.book.pk, self.second_book.pk})
+        self.assertEqual([row['id'] for row in data['changes']['borrow_records']], [local_loan.pk])
+
+        cursor = data['cursor']
+        local_id, harbour_id = local_loan.pk, harbour_loan.pk
+        local_loan.delete()
+        BorrowRecord.objects.create(book=elsewhere, member=harbour_member)  # purged with the book, raw delete
+        harbour_loan.delete()
+        deletion.run(deletion.schedule(elsewhere, harbour_librarian))
+        data = self.client.get('/sync/changes/', {'since': cursor}).data
+        self.assertEqual(data['deleted'], {'authors': [], 'books': [], 'borrow_records': [local_id]})
+        self.login(harbour_librarian)
+        data = self.client.get('/sync/changes/', {'since': cursor}).data
+        self.assertEqual(data['deleted']['books'], [elsewhere.pk])
+        self.assertEqual(len(data['deleted']['borrow_records']), 2)
+        self.assertIn(harbour_id, data['deleted']['borrow_records'])
+
+
+class LeanMiddlewareTests(LibraryTestCase):
+    def chain(self, request):
+        """
+        Run `request` through the lean session, CSRF, auth and messages middleware
+        and return what the view would see, or the middleware's own response.
+        """
+        seen = {}
+
+        def view(request):
+            seen.update(session=hasattr(request, 'session'), messages=hasattr(request, '_messages'), user=request.user)
+            return HttpResponse()
+
+        def dispatch(request):
+            # like the handler, process_view hooks run once every __call__ passed the request on
+            return csrf.process_view(request, view, (), {}) or view(request)
+
+        csrf = LeanCsrfViewMiddleware(LeanAuthenticationMiddleware(LeanMessageMiddleware(dispatch)))
+        response = LeanSessionMiddleware(csrf)(request)
+        return seen or response
+
+    def test_bearer_api_requests_skip_session_and_csrf(self):
+        request = RequestFactory().post('/books/', HTTP_AUTHORIZATION='Bearer abc')
+        self.assertEqual(self.chain(request), {'session': False, 'messages': False, 'user': AnonymousUser()})
+
+    def test_other_requests_are_unchanged(self):
+        factory = RequestFactory()
+        for request in (
+            factory.post('/books/'),  # session client
+            factory.post('/books/', HTTP_AUTHORIZATION='Token abc'),
+            factory.post('/admin/login/', HTTP_AUTHORIZATION='Bearer abc'),  # outside API_PATH_PREFIXES
+        ):
+            self.assertEqual(self.chain(request).status_code, 403)  # CSRF failure
+            request._dont_enforce_csrf_checks = True
+            seen = self.chain(request)
+            self.assertTrue(seen['session'] and seen['messages'])
+            self.assertIsInstance(seen['user'], AnonymousUser)
+
+    def test_bearer_and_session_clients_end_to_end(self):
+        token = AccessToken.for_user(self.member)
+        response = self.client.get('/auth/users/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.data['username'], 'member')
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.client.force_login(self.librarian)
+        self.assertEqual(self.client.get('/auth/users/me/').data['username'], 'librarian')
+        self.assertIn('Cookie', self.client.get('/auth/users/me/').get('Vary', ''))
+
+
+class CoverSignalTests(TestCase):
+    def test_availability_saves_dont_schedule_renders(self):
+        branch = Branch.objects.create(name='Central', code='central')
+        author = Author.objects.create(name='Author', biography='-')
+        book = Book.objects.create(title='Book', author=author, ISBN='9780306406157', category='C', branch=branch, cover='covers/a.jpg')
+        with mock.patch('library.covers.schedule') as schedule, self.captureOnCommitCallbacks(execute=True):
+            book = Book.objects.get(pk=book.pk)
+            book.availability_status = False
+            book.save()
+            book.save(update_fields=['availability_status'])
+        schedule.assert_not_called()
+        with mock.patch('library.covers.schedule') as schedule, self.captureOnCommitCallbacks(execute=True):
+            book.cover = 'covers/b.jpg'
+            book.save(update_fields=['cover'])
+            book.save()
+        schedule.assert_called_once()
+
+
+def cover_image(size=(600, 900), color='navy'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile('cover.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(COVER_THUMBNAIL_WORKERS=0, COVER_THUMBNAIL_SIZES={'small': 160, 'medium': 320})
+class CoverUploadTests(LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, image):
+        self.login(self.librarian)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/books/{self.book.pk}/cover/', {'image': image}, format='multipart')
+
+    def test_upload_stores_the_original_by_hash_and_renders_thumbnails(self):
+        response = self.upload(cover_image())
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        self.assertRegex(self.book.cover.name, r'^covers/[0-9a-f]{20}\.jpg$')
+        self.assertEqual(self.book.cover_thumbnails['source'], self.book.cover.name)
+        for variant, width in [('small', 160), ('medium', 320)]:
+            with Image.open(default_storage.path(self.book.cover_thumbnails[variant])) as thumbnail:
+                self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (width, width * 3 // 2)))
+        thumbnails = self.client.get(f'/books/{self.book.pk}/').data['thumbnails']
+        self.assertEqual(sorted(thumbnails), ['medium', 'small'])
+
+        # new bytes, new name: a cached cover url never goes stale
+        first = self.book.cover.name
+        self.assertEqual(self.upload(cover_image(color='maroon')).status_code, 200)
+        self.book.refresh_from_db()
+        self.assertNotEqual(self.book.cover.name[:27], first[:27])
+        self.assertEqual(self.book.cover_thumbnails['source'], self.book.cover.name)
+
+    def test_rejected_uploads(self):
+        self.assertEqual(self.upload(SimpleUploadedFile('cover.jpg', b'not an image')).status_code, 400)
+        with override_settings(COVER_MAX_UPLOAD_BYTES=100):
+            response = self.upload(cover_image())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.login(self.member)
+        response = self.client.post(f'/books/{self.book.pk}/cover/', {'image': cover_image()}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.cover)
+
+    def test_delete_cover(self):
+        self.upload(cover_image())
+        self.assertEqual(self.client.delete(f'/books/{self.book.pk}/cover/').status_code, 204)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.cover.name, self.book.cover_thumbnails), ('', {}))
+
+    def test_cover_file(self):
+        self.upload(cover_image())
+        self.book.refresh_from_db()
+        self.client.logout()
+        response = self.client.get(f'/{self.book.cover.url.lstrip("/")}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(b''.join(response.streaming_content), self.book.cover.read())
+        self.book.cover.close()
+        thumbnail = self.book.cover_thumbnails['small']
+        self.assertEqual(self.client.get(f'/media/{thumbnail}').status_code, 200)
+        for missing in ['covers/nope.jpg', 'covers/../../settings.py', 'covers/thumbs']:
+            self.assertEqual(self.client.get(f'/media/{missing}').status_code, 404)
+        self.assertEqual(self.client.post(f'/{self.book.cover.url.lstrip("/")}').status_code, 405)
+
+
+class StartupTests(TestCase):
+    def test_docs_decorator_without_drf_yasg(self):
+        def view(request):
+            return HttpResponse()
+
+        # a None entry makes `import drf_yasg.utils` fail, as it would in a lean deployment without it
+        with override_settings(ENABLE_API_DOCS=False), mock.patch.dict(sys.modules, {'drf_yasg.utils': None}):
+            decorated = docs.swagger_auto_schema(operation_description='docs')(view)
+        self.assertIs(decorated, view)
+        self.assertFalse(hasattr(view, '_swagger_auto_schema'))
+
+        with override_settings(ENABLE_API_DOCS=True):
+            decorated = docs.swagger_auto_schema(operation_description='docs')(view)
+        self.assertEqual(decorated._swagger_auto_schema['operation_description'], 'docs')
+
+    def test_warm_up_fills_the_lazy_caches(self):
+        clear_url_caches()
+        self.addCleanup(clear_url_caches)
+        for model in apps.get_models():
+            model._meta._expire_cache()
+        self.assertFalse(get_resolver()._populated)
+        self.assertFalse(Book._meta._get_fields_cache)
+
+        self.assertGreaterEqual(warm_up(), 0)
+        self.assertTrue(get_resolver()._populated)
+        self.assertIn('book-detail', get_resolver().reverse_dict)
+        self.assertTrue(Book._meta._get_fields_cache)
@@ -0,0 +1,62 @@
+# library/utils.py
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+
+
+def _isbn10_check_digit(digits):
+    total = sum((10 - i) * int(d) for i, d in enumerate(digits[:9]))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def _isbn13_check_digit(digits):
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    """
+    Normalize an ISBN-10, ISBN-13 or EAN-13 barcode to a bare 13 digit ISBN.
+    - Hyphens and spaces are stripped, ISBN-10s are converted to the 978 prefix.
+    - Raises ValidationError when the length or checksum is wrong.
+    """
+    raw = str(value).replace('-', '').replace(' ', '').strip().upper()
+
+    if len(raw) == 10:
+        if not raw[:9].isdigit() or not (raw[9].isdigit() or raw[9] == 'X'):
+            raise ValidationError(f"'{value}' is not a valid ISBN-10.")
+        if _isbn10_check_digit(raw) != raw[9]:
+            raise ValidationError(f"'{value}' has an invalid ISBN-10 checksum.")
+        body = '978' + raw[:9]
+        return body + _isbn13_check_digit(body)
+
+    if len(raw) == 13:
+        if not raw.isdigit():
+            raise ValidationError(f"'{value}' is not a valid ISBN-13.")
+        if not raw.startswith(('978', '979')):
+            raise ValidationError(f"'{value}' is an EAN barcode but not a book (978/979) barcode.")
+        if _isbn13_check_digit(raw) != raw[12]:
+            raise ValidationError(f"'{value}' has an invalid ISBN-13 checksum.")
+        return raw
+
+    raise ValidationError(f"'{value}' must be 10 or 13 digits long.")
+
+
+def encode_sync_cursor(sequence):
+    return base64.urlsafe_b64encode(f'v1:{sequence}'.encode()).decode().rstrip('=')
+
+
+def decode_sync_cursor(cursor):
+    """
+    Opaque /sync/changes/ cursor -> change sequence number, ValueError when malformed.
+    """
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        version, sequence = base64.urlsafe_b64decode(padded.encode()).decode().split(':')
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('malformed cursor')
+    if version != 'v1' or not sequence.isdigit():
+        raise ValueError('malformed cursor')
+    return int(sequence)
@@ -1,33 +1,115 @@
 # library/views.py
+import asyncio
+import datetime
+import json
+import os
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, action, throttle_classes
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import get_object_or_404
-from .models import Author, Book, BorrowRecord
-from .serializers import AuthorSerializer, BookSerializer, BorrowRecordSerializer, BorrowSerializer, ReturnSerializer
-from users.models import CustomUser, get_user_role
+from .models import Author, Book, BorrowRecord, CirculationEvent, ArchivedBorrowRecord, SyncChange, BookNeighbour, DailyCategoryBorrows, DailyTitleBorrows, DailyActiveMembers, DailyBranchActiveMembers, DeletionJob
+from .serializers import AuthorSerializer, BookSerializer, BorrowRecordSerializer, BorrowSerializer, ReturnSerializer, IsbnLookupSerializer, CirculationEventSerializer, BorrowHistorySerializer, RelatedBookSerializer, DeletionJobSerializer, BatchSerializer, CoverUploadSerializer
+from .utils import normalize_isbn, encode_sync_cursor, decode_sync_cursor
+from .query_budget import QueryBudget, query_budget
+from .conditional import ConditionalReadMixin
+from . import autocomplete
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError, SuspiciousFileOperation
+from users.models import CustomUser, get_user_role, get_user_branch_id
 from users.permissions import IsLibrarian, IsMember, IsAdminUser
-from drf_yasg.utils import swagger_auto_schema
+from users.throttling import BorrowRateThrottle
+from library_management.docs import swagger_auto_schema
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from django.db import transaction
+from django.db.models import Value, BooleanField, Q, Sum, F
+from django.http import StreamingHttpResponse, JsonResponse, FileResponse, Http404
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from . import events, deletion, batch
 
-class AuthorViewSet(viewsets.ModelViewSet):
+
+def _for_branch(queryset, user, field='branch'):
+    """
+    Restrict `queryset` to the user's branch; users without a branch see every branch.
+    """
+    branch_id = get_user_branch_id(user)
+    if branch_id is None:
+        return queryset
+    return queryset.filter(**{f'{field}_id': branch_id})
+
+
+def _autocomplete_response(request, index, queryset, field, group=None):
+    """
+    Shared typeahead handler, `?q=<prefix>&limit=<n>`.
+    Served from the in-process prefix index, or from a trigram backed
+    `istartswith` query when AUTOCOMPLETE_IN_MEMORY is off.
+    """
+    prefix = request.query_params.get('q', '').strip()
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 50)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not prefix or limit < 1:
+        return Response([])
+    if getattr(settings, 'AUTOCOMPLETE_IN_MEMORY', True):
+        results = index.search(prefix, limit, group)
+    else:
+        rows = queryset.filter(**{f'{field}__istartswith': prefix}).order_by(field).values_list('id', field)[:limit]
+        results = [{'id': pk, 'label': label} for pk, label in rows]
+    return Response(results)
+
+
+class AuthorViewSet(ConditionalReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing authors.
     - Librarians have full access.
     - Members can only view authors.
+    - List and detail responses carry ETag/Last-Modified, conditional GETs get a 304.
     """
-    queryset = Author.objects.all()
+    queryset = Author.objects.filter(pending_deletion=False)
     serializer_class = AuthorSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+    sync_model = 'author'
+    query_budgets = {
+        'list': QueryBudget(3, ms=200),  # version + page + count
+        'retrieve': QueryBudget(2, ms=100),  # version + row
+        'autocomplete': QueryBudget(0, ms=20, params={'q': 'auth'}),  # in-process index once warm
+    }
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             self.permission_classes = [IsLibrarian]
         return super().get_permissions()
 
-class BookViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Typeahead for author names, `GET /authors/autocomplete/?q=orw`.
+        """
+        return _autocomplete_response(request, autocomplete.author_names, self.get_queryset(), 'name')
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Hides the author and their books at once, the cascade runs in the background
+        (`manage.py process_deletions`). Returns 202 with the deletion job id.
+        Librarians assigned to a branch can only delete authors whose books are all in that branch.
+        """
+        author = self.get_object()
+        branch_id = get_user_branch_id(request.user)
+        if branch_id is not None and Book.objects.filter(author=author).exclude(branch_id=branch_id).exists():
+            return Response({'error': 'this author has books in other branches'}, status=status.HTTP_403_FORBIDDEN)
+        job = deletion.schedule(author, request.user)
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class BookViewSet(ConditionalReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing books.
     
@@ -40,42 +122,264 @@ class BookViewSet(viewsets.ModelViewSet):
     - `POST /books/` - Create a new book (Librarian only)
     - `GET /books/{id}/` - Retrieve a specific book
     - `PUT /books/{id}/` - Update a book (Librarian only)
-    - `DELETE /books/{id}/` - Delete a book (Librarian only)
+    - `DELETE /books/{id}/` - Delete a book (Librarian only), returns 202 and runs in the background
+    - `GET|POST /books/by-isbn/` - Resolve many ISBNs in one query
+    - `GET /books/autocomplete/?q=` - Typeahead on book titles
+    - `GET /books/{id}/related/` - Members also borrowed
+    - `POST|DELETE /books/{id}/cover/` - Upload or remove the cover image (Librarian only)
+
+    Users assigned to a branch only see and catalogue that branch's books.
+    List and detail responses carry ETag/Last-Modified, conditional GETs get a 304.
     """
-    queryset = Book.objects.all()
+    queryset = Book.objects.filter(pending_deletion=False)
     serializer_class = BookSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'catalog'
+    sync_model = 'book'
+    query_budgets = {
+        'list': QueryBudget(3, ms=200),  # version + page + count
+        'retrieve': QueryBudget(2, ms=100),  # version + row
+        'by_isbn': QueryBudget(1, ms=100, params={'isbn': '9780000000001,0-306-40615-2'}),
+        'autocomplete': QueryBudget(0, ms=20, params={'q': 'bo'}),
+        'related': QueryBudget(1, ms=100),
+    }
+
+    def get_queryset(self):
+        return _for_branch(super().get_queryset(), self.request.user)
     
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'cover']:
             self.permission_classes = [IsLibrarian]
         return super().get_permissions()
 
-class BorrowRecordViewSet(viewsets.ModelViewSet):
+    def destroy(self, request, *args, **kwargs):
+        job = deletion.schedule(self.get_object(), request.user)
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(methods=['post'], request_body=IsbnLookupSerializer)
+    @action(detail=False, methods=['get', 'post'], url_path='by-isbn')
+    def by_isbn(self, request):
+        """
+        Batch ISBN lookup for scanning stations.
+        - `GET /books/by-isbn/?isbn=0-7475-3269-9,978-0451524935`
+        - `POST /books/by-isbn/` with `{"isbns": ["0747532699", "9780451524935"]}`
+        ISBN-10, hyphenated ISBN-13 and EAN codes are accepted. All codes are
+        resolved with a single `IN` query on the unique ISBN index.
+        """
+        if request.method == 'GET':
+            data = {'isbns': [code for code in request.query_params.get('isbn', '').split(',') if code.strip()]}
+        else:
+            data = request.data
+        serializer = IsbnLookupSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        normalized = {}  # scanned code -> normalized ISBN
+        invalid = []
+        for code in serializer.validated_data['isbns']:
+            try:
+                normalized[code] = normalize_isbn(code)
+            except DjangoValidationError:
+                invalid.append(code)
+
+        books = {book.ISBN: book for book in self.get_queryset().filter(ISBN__in=set(normalized.values()))}
+        results = []
+        not_found = []
+        for code, isbn in normalized.items():
+            if isbn in books:
+                results.append({'query': code, 'book': BookSerializer(books[isbn]).data})
+            else:
+                not_found.append(code)
+        return Response({'results': results, 'not_found': not_found, 'invalid': invalid})
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Typeahead for book titles, `GET /books/autocomplete/?q=harry po`.
+        Matches the start of any word in the title.
+        """
+        return _autocomplete_response(
+            request, autocomplete.book_titles, self.get_queryset(), 'title', get_user_branch_id(request.user)
+        )
+
+    @swagger_auto_schema(methods=['post'], request_body=CoverUploadSerializer)
+    @action(detail=True, methods=['post', 'delete'], parser_classes=[MultiPartParser, FormParser])
+    def cover(self, request, pk=None):
+        """
+        Upload (`POST`, multipart field `image`) or remove (`DELETE`) the cover.
+        The original is stored under its content hash; thumbnails are rendered
+        in a background process pool and appear in `thumbnails` once ready.
+        """
+        book = self.get_object()
+        if request.method == 'DELETE':
+            book.cover = ''
+            book.cover_thumbnails = {}
+            book.save(update_fields=['cover', 'cover_thumbnails', 'updated_at'])
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = CoverUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        book.cover = serializer.validated_data['image']
+        book.cover_thumbnails = {}
+        book.save(update_fields=['cover', 'cover_thumbnails', 'updated_at'])
+        return Response(self.get_serializer(book).data)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        "Members also borrowed" titles, best first.
+        Precomputed by `manage.py build_recommendations`, read with one indexed query.
+        """
+        neighbours = (
+            _for_branch(BookNeighbour.objects.all(), request.user, 'related__branch')
+            .filter(book_id=pk, related__pending_deletion=False)
+            .select_related('related').order_by('rank')
+        )
+        return Response(RelatedBookSerializer(neighbours, many=True).data)
+
+class BorrowRecordViewSet(ConditionalReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing borrow records.
     - Librarians have full access.
     - Members can only view their own borrow records.
+    - Librarians assigned to a branch only see that branch's loans.
+    - `GET /borrow-records/?include_archived=true` also lists loans moved to the
+      archive table by `manage.py archive_borrow_records`, newest first; `?ordering=`
+      accepts `id`, `borrow_date` and `return_date` there.
+    - List and detail responses carry ETag/Last-Modified, conditional GETs get a 304.
     """
     queryset = BorrowRecord.objects.all()
     serializer_class = BorrowRecordSerializer
     permission_classes = [IsAuthenticated]
+    sync_model = 'borrowrecord'
+    query_budgets = {'list': QueryBudget(3, ms=200), 'retrieve': QueryBudget(2, ms=100, role='member')}
+    archived_ordering_fields = ('id', 'borrow_date', 'return_date')
+
+    def etag_scope(self):
+        return super().etag_scope() + [self.request.user.pk]  # members only see their own loans
     
     def get_queryset(self):
         user = self.request.user
         user_role = get_user_role(user)
         
         if user_role == 'librarian':
-            return BorrowRecord.objects.all()
+            return _for_branch(BorrowRecord.objects.all(), user)
         elif user_role == 'member':
             return BorrowRecord.objects.filter(member=user)
         return BorrowRecord.objects.none()  # Return empty queryset for other cases
+
+    def include_archived(self):
+        return self.action == 'list' and self.request.query_params.get('include_archived') == 'true'
+
+    def get_serializer_class(self):
+        if self.include_archived():
+            return BorrowHistorySerializer
+        return super().get_serializer_class()
+
+    def archived_ordering(self):
+        """
+        `?ordering=` for the merged listing, only the columns both tables share; newest first by default.
+        """
+        terms = [
+            term.strip() for term in self.request.query_params.get('ordering', '').split(',')
+            if term.strip().lstrip('-') in self.archived_ordering_fields
+        ]
+        if not any(term.lstrip('-') == 'id' for term in terms):
+            terms.append('-id')  # stable pages
+        return terms
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not self.include_archived():
+            return queryset
+        # one UNION query over the hot and archive tables, paginated as usual; the parts of a
+        # compound statement can't carry their own ORDER BY, so ordering is applied to the union
+        columns = ['id', 'book_id', 'member_id', 'branch_id', 'borrow_date', 'return_date', 'archived']
+        archived = ArchivedBorrowRecord.objects.all()
+        if get_user_role(self.request.user) != 'librarian':
+            archived = archived.filter(member=self.request.user)
+        else:
+            archived = _for_branch(archived, self.request.user)
+        live = queryset.order_by().annotate(archived=Value(False, output_field=BooleanField())).values(*columns)
+        archived = archived.annotate(archived=Value(True, output_field=BooleanField())).values(*columns)
+        return live.union(archived, all=True).order_by(*self.archived_ordering())
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             self.permission_classes = [IsLibrarian]
         return super().get_permissions()
+
+    # librarian edits keep the member's open-loan counter in step, deletes through the post_delete signal
+    def perform_update(self, serializer):
+        previous = (serializer.instance.member_id, serializer.instance.return_date is None)
+        with transaction.atomic():
+            serializer.save().adjust_open_loans(previous)
     
+class DeletionJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Progress of background Author/Book deletions, librarians only.
+    Librarians assigned to a branch see that branch's jobs.
+    """
+    queryset = DeletionJob.objects.order_by('-id')
+    serializer_class = DeletionJobSerializer
+    permission_classes = [IsLibrarian]
+    query_budgets = {'list': QueryBudget(2, ms=200), 'retrieve': QueryBudget(1, ms=100)}
+
+    def get_queryset(self):
+        return _for_branch(super().get_queryset(), self.request.user)
+
+
+class CirculationEventViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only access to the append-only circulation event log.
+    - Librarians see all events (of their branch's books when assigned to one), members only their own.
+    - Filters: `?book=<id>`, `?member=<id>`, `?since=<date|datetime>`, `?until=<date|datetime>`
+    Every filter combination is served by a (book|member, occurred_at) or
+    (occurred_at) index, and time windows only touch the matching monthly partitions.
+    """
+    queryset = CirculationEvent.objects.all()
+    serializer_class = CirculationEventSerializer
+    permission_classes = [IsAuthenticated]
+    query_budgets = {'list': QueryBudget(2, ms=200), 'retrieve': QueryBudget(1, ms=100, role='member')}
+
+    def _parse_time(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.datetime.combine(day, datetime.time())
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def get_queryset(self):
+        user = self.request.user
+        user_role = get_user_role(user)
+
+        if user_role == 'librarian':
+            events = _for_branch(CirculationEvent.objects.all(), user, 'book__branch')
+        elif user_role == 'member':
+            events = CirculationEvent.objects.filter(member=user)
+        else:
+            return CirculationEvent.objects.none()
+
+        params = self.request.query_params
+        if params.get('book', '').isdigit():
+            events = events.filter(book_id=params['book'])
+        if params.get('member', '').isdigit():
+            events = events.filter(member_id=params['member'])
+        since = self._parse_time('since')
+        if since:
+            events = events.filter(occurred_at__gte=since)
+        until = self._parse_time('until')
+        if until:
+            events = events.filter(occurred_at__lt=until)
+        return events.order_by('-occurred_at', '-id')
+
 """
 ^
 in swagger it shows endpoints: 
@@ -99,6 +403,7 @@ DELETE /borrow-records/{id}/
 )
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsMember|IsLibrarian])
+@throttle_classes([BorrowRateThrottle])
 def borrow_book(request):
     """
     Borrow a book from the library.
@@ -122,19 +427,32 @@ def borrow_book(request):
     - Only members and librarians can borrow books
     - The authenticated user will be automatically set as the borrower
     - Borrow date is automatically set to current date
+    - Users assigned to a branch can only borrow that branch's books
+    - At most `LOAN_LIMITS[role]` open loans (or the member's own `loan_limit`)
+    - Rate limited by the `borrow` throttle scope (higher quota for librarians)
     """
     serializer = BorrowSerializer(data=request.data)
     if serializer.is_valid():
         book_id = serializer.validated_data['book']        
-        book = get_object_or_404(Book, id=book_id)
+        book = get_object_or_404(_for_branch(Book.objects.all(), request.user), id=book_id, pending_deletion=False)
         member = request.user
         if not member.is_member or member.is_librarian:
             return Response({'error': 'Only a member or librarian can borrow books'}, status=status.HTTP_400_BAD_REQUEST)
         if not book.availability_status:
             return Response({'error': 'Book is not available for borrowing'}, status=status.HTTP_400_BAD_REQUEST)
-        borrow_record = BorrowRecord.objects.create(book=book, member=member)        
-        book.availability_status = False
-        book.save()        
+        limit = member.effective_loan_limit
+        with transaction.atomic():
+            # the limit is checked by the UPDATE itself, no COUNT of open loans and no race between checkouts
+            counter = CustomUser.objects.filter(pk=member.pk)
+            if limit is not None:
+                counter = counter.filter(open_loans__lt=limit)
+            if not counter.update(open_loans=F('open_loans') + 1):
+                return Response({'error': f'Loan limit reached, at most {limit} books can be borrowed at once'}, status=status.HTTP_400_BAD_REQUEST)
+            borrow_record = BorrowRecord.objects.create(book=book, member=member, branch_id=book.branch_id)
+            book.availability_status = False
+            book.save()
+            CirculationEvent.log('borrow', borrow_record)
+            transaction.on_commit(lambda: events.publish_availability(book, 'borrow'))
         return Response(BorrowRecordSerializer(borrow_record).data, status=status.HTTP_201_CREATED)    
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -174,26 +492,312 @@ def return_book(request):
     - Only members and librarians can return books
     - Return date is automatically set to current date
     - Members can only return their own borrowed books
-    - Librarians can return any borrowed book
+    - Librarians can return any borrowed book of their branch
     """
     serializer = ReturnSerializer(data=request.data)
     if serializer.is_valid():
         borrow_record_id = serializer.validated_data['borrow_record_id']        
-        borrow_record = get_object_or_404(BorrowRecord, id=borrow_record_id)        
+        records = BorrowRecord.objects.all()
+        if request.user.role == 'librarian':
+            records = _for_branch(records, request.user)
+        borrow_record = get_object_or_404(records, id=borrow_record_id)
         if borrow_record.return_date is not None:
             return Response({'error': 'Book has already been returned'}, status=status.HTTP_400_BAD_REQUEST)
         if request.user.role == 'member' and borrow_record.member != request.user:
             return Response({'error': 'members can only return their own borrowed books'}, status=status.HTTP_403_FORBIDDEN)
-        borrow_record.return_date = timezone.now().date()
-        borrow_record.save()
-        borrow_record.book.availability_status = True
-        borrow_record.book.save()
-        
+        with transaction.atomic():
+            # row lock, so two concurrent returns of one loan can't both decrement the counter
+            still_open = BorrowRecord.objects.select_for_update().filter(pk=borrow_record.pk, return_date__isnull=True)
+            if not list(still_open.values_list('pk', flat=True)):
+                return Response({'error': 'Book has already been returned'}, status=status.HTTP_400_BAD_REQUEST)
+            borrow_record.return_date = timezone.now().date()
+            borrow_record.save()
+            CustomUser.adjust_open_loans(borrow_record.member_id, -1)
+            borrow_record.book.availability_status = True
+            borrow_record.book.save()
+            CirculationEvent.log('return', borrow_record)
+            transaction.on_commit(lambda: events.publish_availability(borrow_record.book, 'return'))
+
         return Response(BorrowRecordSerializer(borrow_record).data, status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
+@query_budget(4, ms=300)  # feed batch + one IN query per model
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """
+    Delta sync for offline clients.
+
+    ### Request URL:
+    ```
+    GET /sync/changes/?since=<cursor>&limit=500
+    ```
+
+    ### Notes:
+    - Without `since` the whole catalog is returned, batch by batch
+    - Pass the returned `cursor` as `since` on the next call, keep calling while `has_more` is true
+    - `deleted` lists ids removed since the cursor (tombstones)
+    - Members only receive their own borrow records
+    - Users assigned to a branch only receive that branch's books and borrow records
+    - Changes show up once they are `SYNC_SAFETY_LAG_SECONDS` old, so a change committed
+      late with a lower id is never skipped by a cursor that already moved past it
+    - Each batch is one range scan on the change sequence plus one `IN` query per model
+    """
+    try:
+        since = decode_sync_cursor(request.query_params['since']) if request.query_params.get('since') else 0
+    except ValueError:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    max_batch = getattr(settings, 'SYNC_BATCH_SIZE', 500)
+    try:
+        limit = min(int(request.query_params.get('limit', max_batch)), max_batch)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+
+    feed = SyncChange.objects.filter(id__gt=since).order_by('id')
+    user_role = get_user_role(request.user)
+    if user_role != 'librarian':
+        feed = feed.filter(~Q(model='borrowrecord') | Q(member_id=request.user.pk))
+    branch_id = get_user_branch_id(request.user)
+    if branch_id is not None:
+        feed = feed.filter(Q(branch_id__isnull=True) | Q(branch_id=branch_id))  # authors carry no branch
+    rows = list(feed.values_list('id', 'model', 'object_id', 'deleted', 'changed_at')[:limit + 1])
+    # ids are taken at INSERT but transactions commit out of order: a change younger than the
+    # safety lag may still have a lower id in flight, so the batch (and the cursor) stops before it
+    horizon = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'SYNC_SAFETY_LAG_SECONDS', 5))
+    settled = next((i for i, row in enumerate(rows) if row[4] > horizon), len(rows))
+    has_more = settled > limit
+    batch = rows[:min(settled, limit)]
+
+    sources = {
+        'author': ('authors', Author.objects.filter(pending_deletion=False), AuthorSerializer),
+        'book': ('books', _for_branch(Book.objects.filter(pending_deletion=False), request.user), BookSerializer),
+        'borrowrecord': ('borrow_records', _for_branch(BorrowRecord.objects.all(), request.user), BorrowRecordSerializer),
+    }
+    changed_ids = {model: [] for model in sources}
+    deleted = {key: [] for key, _, _ in sources.values()}
+    for _, model, object_id, is_deleted, _ in batch:
+        if object_id == SyncChange.VERSION_MARKER:
+            continue
+        if is_deleted:
+            deleted[sources[model][0]].append(object_id)
+        else:
+            changed_ids[model].append(object_id)
+
+    changes = {}
+    for model, (key, queryset, serializer_class) in sources.items():
+        rows = queryset.filter(id__in=changed_ids[model]).order_by('id') if changed_ids[model] else []
+        changes[key] = serializer_class(rows, many=True).data
+
+    cursor = encode_sync_cursor(batch[-1][0] if batch else since)
+    return Response({'changes': changes, 'deleted': deleted, 'cursor': cursor, 'has_more': has_more})
+
+
+@swagger_auto_schema(
+    method='post',
+    request_body=BatchSerializer,
+    examples={
+        "application/json": {
+            "requests": [{"id": "books", "url": "/books/"}, {"id": "me", "url": "/auth/users/me/"}]
+        }
+    }
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_requests(request):
+    """
+    Run several API reads in one round trip.
+
+    ### Request URL:
+    ```
+    POST /batch/
+    ```
+
+    ### Request Body Example:
+    ```json
+    {
+        "requests": [
+            {"id": "books", "url": "/books/?page=2"},
+            {"id": "me", "url": "/auth/users/me/"},
+            {"id": "book", "url": "/books/1/", "headers": {"If-None-Match": "\"etag\""}}
+        ]
+    }
+    ```
+
+    ### Notes:
+    - Only GET sub-requests, at most `BATCH_MAX_REQUESTS` of them
+    - The caller is authenticated once, every sub-request runs as that user and
+      goes through the target view's own permissions and throttles
+    - Sub-requests are dispatched in-process through the URL resolver, in order,
+      without the middleware stack
+    - Always 200, each entry of `responses` has its own `status`, `headers` and `body`
+    """
+    serializer = BatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    responses = [
+        {'id': entry.get('id', str(position)), **batch.dispatch(request, entry)}
+        for position, entry in enumerate(serializer.validated_data['requests'])
+    ]
+    return Response({'responses': responses})
+
+
+@require_safe
+def cover_file(request, path):
+    """
+    Streams a cover or thumbnail from MEDIA_ROOT/covers in chunks (FileResponse).
+    File names are content hashes, so responses are cacheable forever.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, 'covers', path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    response = FileResponse(open(full_path, 'rb'))
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def _analytics_range(request):
+    """
+    ?start=&end= (inclusive YYYY-MM-DD), defaults to the last 30 days.
+    Returns (start, end) or None when a date is malformed or the range is reversed.
+    """
+    today = timezone.now().date()
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    end = parse_date(end) if end else today
+    start = parse_date(start) if start else (end - datetime.timedelta(days=29) if end else None)
+    if start is None or end is None or start > end:
+        return None
+    return start, end
+
+
+@query_budget(1, ms=100)
+@api_view(['GET'])
+@permission_classes([IsLibrarian])
+def analytics_borrows_by_category(request):
+    """
+    Daily borrows per category, `GET /analytics/borrows-by-category/?start=&end=`.
+    Read from the DailyCategoryBorrows rollup only, summed over branches unless the
+    librarian is assigned to one.
+    """
+    date_range = _analytics_range(request)
+    if date_range is None:
+        return Response({'error': 'start/end must be YYYY-MM-DD with start <= end'}, status=status.HTTP_400_BAD_REQUEST)
+    rows = (
+        _for_branch(DailyCategoryBorrows.objects.filter(day__range=date_range), request.user)
+        .values('day', 'category')
+        .annotate(borrows=Sum('borrows'))
+        .order_by('day', 'category')
+    )
+    return Response([{'day': row['day'], 'category': row['category'], 'borrows': row['borrows']} for row in rows])
+
+
+@query_budget(1, ms=100)
+@api_view(['GET'])
+@permission_classes([IsLibrarian])
+def analytics_top_titles(request):
+    """
+    Most borrowed titles in a range, `GET /analytics/top-titles/?start=&end=&limit=10`.
+    Summed over the DailyTitleBorrows rollup.
+    """
+    date_range = _analytics_range(request)
+    if date_range is None:
+        return Response({'error': 'start/end must be YYYY-MM-DD with start <= end'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 100)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    rows = (
+        _for_branch(DailyTitleBorrows.objects.filter(day__range=date_range), request.user, 'book__branch')
+        .values('book_id', 'book__title')
+        .annotate(borrows=Sum('borrows'))
+        .order_by('-borrows', 'book_id')[:limit]
+    )
+    return Response([{'book': row['book_id'], 'title': row['book__title'], 'borrows': row['borrows']} for row in rows])
+
+
+@query_budget(1, ms=100)
+@api_view(['GET'])
+@permission_classes([IsLibrarian])
+def analytics_active_members(request):
+    """
+    Members who borrowed at least once per day, `GET /analytics/active-members/?start=&end=`.
+    Librarians assigned to a branch get the members who borrowed at that branch.
+    """
+    date_range = _analytics_range(request)
+    if date_range is None:
+        return Response({'error': 'start/end must be YYYY-MM-DD with start <= end'}, status=status.HTTP_400_BAD_REQUEST)
+    branch_id = get_user_branch_id(request.user)
+    if branch_id is None:
+        rows = DailyActiveMembers.objects.filter(day__range=date_range)
+    else:
+        rows = DailyBranchActiveMembers.objects.filter(day__range=date_range, branch_id=branch_id)
+    rows = rows.order_by('day')
+    return Response([{'day': row.day, 'active_members': row.active_members} for row in rows])
+
+
+async def _authenticate_stream(request):
+    # EventSource can't set headers, so the access token may also come as ?token=
+    token = request.GET.get('token')
+    if token and 'HTTP_AUTHORIZATION' not in request.META:
+        request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def availability_stream(request):
+    """
+    Server-Sent Events stream of availability changes, needs the ASGI app (asgi.py).
+
+    ### Request URL:
+    ```
+    GET /events/availability/?books=1,5&categories=Fantasy
+    ```
+
+    ### Notes:
+    - Authenticate with a JWT `Authorization: Bearer` header or `?token=`
+    - Without `books`/`categories` every change is sent
+    - Users assigned to a branch only receive changes of that branch's books
+    - Events are `borrow` and `return`, data is `{"book", "category", "branch", "available"}`
+    - Idle connections are plain coroutines waiting on a queue, no thread per client
+    """
+    user = await _authenticate_stream(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    books = {int(pk) for pk in request.GET.get('books', '').split(',') if pk.strip().isdigit()}
+    categories = {name.strip() for name in request.GET.get('categories', '').split(',') if name.strip()}
+    heartbeat = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+
+    async def stream():
+        subscription = events.availability.subscribe(books, categories, branch=get_user_branch_id(user))
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'  # stops proxies from closing idle streams
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            events.availability.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 """
 while authenticated,
 borrow book:
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_management.settings')
 
 application = get_asgi_application()
+
+# /events/availability/ (server-sent events) needs this ASGI app, e.g.
+# uvicorn library_management.asgi:application
+# one worker process holds all idle streams on its event loop
@@ -61,20 +61,37 @@ INSTALLED_APPS = [
 	"corsheaders", # for later react part, https://pypi.org/project/django-cors-headers/	
 ]
 
+# lean serverless profile: set ENABLE_ADMIN=False / ENABLE_API_DOCS=False in the lambda's environment
+# to skip booting the admin and the swagger/redoc docs, see library_management/warmup.py
+ENABLE_ADMIN = config('ENABLE_ADMIN', default=True, cast=bool)
+ENABLE_API_DOCS = config('ENABLE_API_DOCS', default=True, cast=bool)
+WARM_UP_ON_START = config('WARM_UP_ON_START', default=True, cast=bool)  # prime url/serializer caches when the wsgi app loads
+if not ENABLE_ADMIN:
+    INSTALLED_APPS.remove('django.contrib.admin')
+if not ENABLE_API_DOCS:
+    INSTALLED_APPS.remove('drf_yasg')
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
 	'whitenoise.middleware.WhiteNoiseMiddleware', # ---
 	"corsheaders.middleware.CorsMiddleware", # ---
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # session, csrf, auth and messages are skipped for Bearer requests under API_PATH_PREFIXES
+    'library_management.middleware.LeanSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'library_management.middleware.LeanCsrfViewMiddleware',
+    'library_management.middleware.LeanAuthenticationMiddleware',
+    'library_management.middleware.LeanMessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',	
 ]
 
+# url prefixes served by DRF, see library_management/middleware.py
+API_PATH_PREFIXES = [
+    '/authors/', '/books/', '/borrow-records/', '/circulation-events/', '/deletion-jobs/', '/users/',
+    '/api/', '/auth/', '/library/', '/sync/', '/events/', '/analytics/', '/batch/',
+]
+
 ROOT_URLCONF = 'library_management.urls'
 
 TEMPLATES = [
@@ -178,9 +195,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-		'rest_framework_simplejwt.authentication.JWTAuthentication', # ---
-        'rest_framework.authentication.SessionAuthentication',
+		'rest_framework_simplejwt.authentication.JWTAuthentication', # --- first: a Bearer header is accepted or rejected here
         'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',  # last, the only one that loads the session
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -195,9 +212,65 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
-    ],    
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'users.throttling.RoleScopedThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '10/min',  # jwt/token login, PBKDF2 check is cpu heavy
+        'register': '5/hour',
+        'borrow': '30/min',
+        'borrow_librarian': '300/min',
+        'catalog': '120/min',
+        'catalog_librarian': '1200/min',
+    },
 }
 
+# throttle counters need a cache shared by all workers for limits to hold across processes
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+THROTTLE_CACHE = 'default'
+
+# max number of ISBNs resolved by one /books/by-isbn/ request
+ISBN_LOOKUP_LIMIT = 500
+
+# typeahead: serve /books/autocomplete/ and /authors/autocomplete/ from an in-process prefix index
+AUTOCOMPLETE_IN_MEMORY = True
+AUTOCOMPLETE_MAX_ENTRIES = 500000  # bounds the index memory, ~160 bytes per entry, so ~80 MB per worker at the cap
+AUTOCOMPLETE_SYNC_SECONDS = 5  # how often a worker picks up catalog changes made by other workers
+
+# archive_borrow_records moves loans returned longer ago than this out of the hot table
+BORROW_ARCHIVE_AFTER_DAYS = 365
+
+# max changes returned by one /sync/changes/ call
+SYNC_BATCH_SIZE = 500
+# /sync/changes/ only hands out changes at least this old, must exceed the longest transaction
+# that writes a SyncChange (plus clock skew between workers)
+SYNC_SAFETY_LAG_SECONDS = 5
+
+# neighbours kept per book by build_recommendations
+RECOMMENDATION_TOP_K = 10
+
+# seconds between keep-alive comments on /events/availability/
+SSE_HEARTBEAT_SECONDS = 15
+
+# max sub-requests in one POST /batch/
+BATCH_MAX_REQUESTS = 20
+
+# max open loans per role, CustomUser.loan_limit overrides it per user; roles not listed are unlimited
+LOAN_LIMITS = {'member': 5, 'librarian': 20}
+
+# book covers (library/covers.py): thumbnail widths in px, rendering processes (0 = inline), upload limit
+COVER_THUMBNAIL_SIZES = {'small': 160, 'medium': 320}
+COVER_THUMBNAIL_WORKERS = 2
+COVER_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=90),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -213,6 +286,16 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# bulk member onboarding (users/onboarding.py)
+# branch given to members who register or are onboarded without one (created by users migration 0004)
+DEFAULT_BRANCH_CODE = 'main'
+
+BULK_ONBOARD_LIMIT = 5000  # rows per request
+BULK_ONBOARD_WORKERS = None  # password hashing processes, None = cpu count
+BULK_ONBOARD_EMAIL_BATCH = 50  # activation emails per SMTP connection
+ACTIVATION_EMAIL_WORKERS = 1  # threads sending queued activation emails after commit, 0 leaves them to the command
+ACTIVATION_EMAIL_MAX_ATTEMPTS = 5  # failed sends are retried by later runs up to this many times
+
 DJOSER = {
     'PASSWORD_RESET_CONFIRM_URL': 'password/reset/confirm/{uid}/{token}',
     'USERNAME_RESET_CONFIRM_URL': 'username/reset/confirm/{uid}/{token}',
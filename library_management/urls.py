@@ -15,42 +15,31 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
 from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from library.views import AuthorViewSet, BookViewSet, BorrowRecordViewSet
+from library.views import (
+    AuthorViewSet, BookViewSet, BorrowRecordViewSet, CirculationEventViewSet, DeletionJobViewSet, sync_changes, availability_stream,
+    analytics_borrows_by_category, analytics_top_titles, analytics_active_members, batch_requests, cover_file,
+)
 from users.views import CustomUserViewSet
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
 )
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-from rest_framework import permissions
+from django.conf import settings
+from . import docs
 
 # Create a single router for all viewsets
 router = DefaultRouter()
 router.register('authors', AuthorViewSet)
 router.register('books', BookViewSet)
 router.register('borrow-records', BorrowRecordViewSet)
+router.register('circulation-events', CirculationEventViewSet)
+router.register('deletion-jobs', DeletionJobViewSet)
 router.register('users', CustomUserViewSet)
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Library Management API",
-      default_version='v1',
-      description="API documentation for the Library Management System",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@library.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,  # allows public access to the schema
-   permission_classes=(permissions.AllowAny,),  # allows anyone to access the docs
-)
-
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('', include(router.urls)),  # all viewset endpoints
     # JWT endpoints
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  # POST request to get access/refresh tokens
@@ -58,14 +47,31 @@ urlpatterns = [
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     # function-based views
     path('library/', include('library.urls')),
+    path('sync/changes/', sync_changes, name='sync-changes'),
+    path('events/availability/', availability_stream, name='availability-stream'),
+    path('batch/', batch_requests, name='batch'),  # many GETs in one round trip
+    path('media/covers/<path:path>', cover_file, name='cover-file'),  # content hashed, cached forever
+    # circulation analytics, served from daily rollups
+    path('analytics/borrows-by-category/', analytics_borrows_by_category, name='analytics-borrows-by-category'),
+    path('analytics/top-titles/', analytics_top_titles, name='analytics-top-titles'),
+    path('analytics/active-members/', analytics_active_members, name='analytics-active-members'),
     # djoser endpoints
     path('auth/', include('djoser.urls')),  # auth/users, auth/users/me 
 	path('auth/', include('djoser.urls.authtoken')),
     path('auth/', include('djoser.urls.jwt')),  # Using Djoser's JWT integration    
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
+# optional apps, left out of the lean serverless profile (ENABLE_ADMIN / ENABLE_API_DOCS)
+if settings.ENABLE_ADMIN:
+    from django.contrib import admin
+    urlpatterns.insert(0, path('admin/', admin.site.urls))
+if settings.ENABLE_API_DOCS:
+    # the schema view is built on the first docs request, not at import
+    urlpatterns += [
+        path('swagger/', docs.swagger_ui, name='schema-swagger-ui'),
+        path('redoc/', docs.redoc, name='schema-redoc'),
+    ]
+
 """
 account create and activation(with djoser) example:
 from postman,
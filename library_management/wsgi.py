@@ -24,3 +24,9 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_management.settings")
 
 app = get_wsgi_application()
 
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_UP_ON_START:
+    from .warmup import warm_up
+    warm_up()
+
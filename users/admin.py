@@ -1,21 +1,44 @@
 # users/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, Branch, PendingActivationEmail
 from django.utils import timezone
+from library.paginators import EstimatedCountPaginator
+
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code']
+    search_fields = ['name', 'code']
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     list_display = ['username', 'email', 'role', 'mobile_no', 'membership_date', 'is_staff', 'is_active']
-    list_filter = ['role', 'is_staff', 'is_active', 'membership_date']
+    list_filter = ['role', 'branch', 'is_staff', 'is_active', 'membership_date']
     search_fields = ['username', 'email', 'mobile_no']
     ordering = ['role', 'username']
+    date_hierarchy = 'date_joined'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
+    readonly_fields = ['open_loans']
     fieldsets = UserAdmin.fieldsets + (
-        ('Additional Info', {'fields': ('role', 'mobile_no', 'membership_date')}),
+        ('Additional Info', {'fields': ('role', 'branch', 'mobile_no', 'membership_date')}),
+        ('Loans', {'fields': ('loan_limit', 'open_loans')}),
     )
     
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=CustomUser.fields_without_counter())
+        else:
+            obj.save()
+
     add_fieldsets = UserAdmin.add_fieldsets + (
-        ('Additional Info', {'fields': ('role', 'mobile_no', 'membership_date')}),
+        ('Additional Info', {'fields': ('role', 'branch', 'mobile_no', 'membership_date')}),
     )
     
+
+@admin.register(PendingActivationEmail)
+class PendingActivationEmailAdmin(admin.ModelAdmin):
+    list_display = ['user', 'attempts', 'created_at', 'last_error']
+    list_select_related = ['user']
+    readonly_fields = ['user', 'created_at', 'attempts', 'last_error']
@@ -0,0 +1,129 @@
+import logging
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from library.models import Author, Book
+from users.models import Branch, CustomUser
+
+PASSWORD = 'Correct-Horse-42'
+
+
+def hammer(stop, statuses, address, interval):
+    """
+    An abusive client: a wrong-password login to /api/token/ every `interval` seconds,
+    back to back once answers take longer than that.
+    """
+    client = APIClient(REMOTE_ADDR=address)
+    try:
+        while not stop.is_set():
+            started = time.monotonic()
+            response = client.post('/api/token/', {'username': 'bench_victim', 'password': 'guess'}, format='json')
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            stop.wait(interval - (time.monotonic() - started))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the login throttle: abusive clients hammer /api/token/ while a "
+        "well-behaved client logs in and browses, and its latency is compared with no attack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--abusers', type=int, default=4, help="Concurrent abusive clients, all from one address")
+        parser.add_argument('--rate', type=float, default=20, help="Login attempts per second of all abusive clients together")
+        parser.add_argument('--requests', type=int, default=50, help="Catalog requests of the well-behaved client per phase")
+        parser.add_argument('--logins', type=int, default=3, help="Logins of the well-behaved client per phase")
+
+    def handle(self, *args, **options):
+        logging.getLogger('django.request').setLevel(logging.ERROR)  # one 401/429 warning per abusive request
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        results = []
+        try:
+            branch = Branch.objects.create(name='Bench', code='bench')
+            author = Author.objects.create(name='Benchmark author', biography='-')
+            Book.objects.bulk_create([
+                Book(title=f'Book {i}', author=author, ISBN=f'{i:013d}', category='bench', branch=branch) for i in range(20)
+            ])
+            CustomUser.objects.create_user('bench_member', 'member@bench.test', PASSWORD, role='member', branch=branch)
+            CustomUser.objects.create_user('bench_victim', 'victim@bench.test', PASSWORD, role='member', branch=branch)
+
+            unthrottled = {
+                **settings.REST_FRAMEWORK,
+                'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'auth': '1000000/min'},
+            }
+            phases = [('no attack', 0, {}), ('attack, throttled', options['abusers'], {})]
+            phases.append(('attack, unthrottled', options['abusers'], {'REST_FRAMEWORK': unthrottled}))
+            for name, abusers, overrides in phases:
+                cache.clear()  # throttle counters
+                with override_settings(**overrides):
+                    results.append((name, *self.phase(abusers, options)))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"well-behaved client: {options['logins']} logins and {options['requests']} GET /books/ per phase, "
+            f"{options['abusers']} abusive clients at {options['rate']:g} logins/s"
+        )
+        for name, logins, reads, errors, statuses in results:
+            line = (
+                f"{name:<20} login median {statistics.median(logins):8.1f}ms  "
+                f"GET median {statistics.median(reads):7.2f}ms p95 {self.p95(reads):7.2f}ms"
+            )
+            if statuses:
+                line += '  abusers got ' + ', '.join(f'{count}x {code}' for code, count in sorted(statuses.items()))
+            self.stdout.write(line)
+            if errors:
+                self.stderr.write(f"{name}: the well-behaved client got {', '.join(map(str, sorted(errors)))}")
+
+    @staticmethod
+    def p95(values):
+        return sorted(values)[max(int(len(values) * 0.95) - 1, 0)]
+
+    def phase(self, abusers, options):
+        stop = threading.Event()
+        statuses = {}
+        threads = [
+            threading.Thread(target=hammer, args=(stop, statuses, '10.0.1.1', abusers / options['rate']))
+            for _ in range(abusers)
+        ]
+        for thread in threads:
+            thread.start()
+        # measure once the attack is in full swing, past the abusers' allowance when throttled
+        deadline = time.monotonic() + 15
+        while threads and sum(statuses.values()) < 20 and time.monotonic() < deadline:
+            time.sleep(0.1)
+        client = APIClient(REMOTE_ADDR='10.0.0.1')
+        logins, reads, errors = [], [], set()
+        try:
+            for _ in range(options['logins']):
+                started = time.perf_counter()
+                response = client.post('/api/token/', {'username': 'bench_member', 'password': PASSWORD}, format='json')
+                logins.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors.add(response.status_code)
+                    continue
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                response = client.get('/books/')
+                reads.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors.add(response.status_code)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return logins, reads, errors, statuses
@@ -0,0 +1,48 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Branch
+from users.onboarding import onboard_members, send_activation_emails
+from users.serializers import OnboardMemberSerializer
+
+
+class Command(BaseCommand):
+    help = "Enrol members from a CSV file with username,email,password,mobile_no and optional branch (id) columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--workers', type=int, help="Password hashing processes (default BULK_ONBOARD_WORKERS or cpu count)")
+        parser.add_argument('--branch', help="Code of the branch for rows without one (default DEFAULT_BRANCH_CODE)")
+        parser.add_argument('--send-activation', action='store_true', help="Queue activation emails and send them in batches")
+
+    def handle(self, *args, **options):
+        branch = Branch.objects.filter(code=options['branch']).first() if options['branch'] else Branch.default()
+        if branch is None:
+            raise CommandError(f"No branch with code {options['branch']!r}." if options['branch'] else "No default branch, pass --branch.")
+
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+        except OSError as e:
+            raise CommandError(str(e))
+        for row in rows:
+            if not row.get('branch'):
+                row.pop('branch', None)  # empty cell, the --branch default applies
+
+        serializer = OnboardMemberSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            for line, errors in enumerate(serializer.errors, start=2):
+                if errors:
+                    self.stderr.write(f"line {line}: {errors}")
+            raise CommandError("Fix the rows above, nothing was created.")
+
+        result = onboard_members(serializer.validated_data, options['workers'], options['send_activation'], branch)
+        for row, reason in result['skipped']:
+            self.stdout.write(f"skipped {row['username']} <{row['email']}>: {reason}")
+        self.stdout.write(self.style.SUCCESS(f"Created {len(result['created'])} members."))
+        if result['activation_queued']:
+            sent = send_activation_emails([user.pk for user in result['created']])
+            for email in sent['unsent']:
+                self.stderr.write(f"activation email to {email} failed, retried by send_activation_emails")
+            self.stdout.write(f"Sent {sent['sent']} activation emails.")
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.models import PendingActivationEmail
+from users.onboarding import send_activation_emails
+
+
+class Command(BaseCommand):
+    help = "Send the activation emails queued by bulk onboarding, retrying earlier failures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Emails per SMTP connection (default BULK_ONBOARD_EMAIL_BATCH)")
+
+    def handle(self, *args, **options):
+        result = send_activation_emails(batch_size=options['batch_size'])
+        for email in result['unsent']:
+            self.stderr.write(f"could not send to {email}")
+        given_up = PendingActivationEmail.objects.filter(attempts__gte=getattr(settings, 'ACTIVATION_EMAIL_MAX_ATTEMPTS', 5))
+        for email, error in given_up.values_list('user__email', 'last_error'):
+            self.stderr.write(self.style.WARNING(f"gave up on {email}: {error}"))
+        self.stdout.write(self.style.SUCCESS(f"Sent {result['sent']} activation emails, {len(result['unsent'])} failed."))
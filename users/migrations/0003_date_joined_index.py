@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_alter_customuser_email'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['date_joined'], name='user_date_joined_idx'),
+        ),
+    ]
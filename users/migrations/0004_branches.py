@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_main_branch(apps, schema_editor):
+    # the existing single library becomes the first branch; admins stay unscoped
+    Branch = apps.get_model('users', 'Branch')
+    CustomUser = apps.get_model('users', 'CustomUser')
+    main, _ = Branch.objects.get_or_create(code='main', defaults={'name': 'Main branch'})
+    CustomUser.objects.filter(role__in=['librarian', 'member']).update(branch=main)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_date_joined_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.SlugField(max_length=20, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='users', to='users.branch'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['branch', 'role'], name='user_branch_role_idx'),
+        ),
+        migrations.RunPython(create_main_branch, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:13
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_open_loans(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    BorrowRecord = apps.get_model('library', 'BorrowRecord')
+    open_loans = (
+        BorrowRecord.objects.filter(member=OuterRef('pk'), return_date__isnull=True)
+        .order_by().values('member').annotate(n=Count('id')).values('n')
+    )
+    CustomUser.objects.update(open_loans=Coalesce(Subquery(open_loans, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_branches'),
+        ('library', '0014_book_covers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='loan_limit',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='open_loans',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_open_loans, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 # users/models.py
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser, AnonymousUser
 from django.utils import timezone
@@ -8,11 +9,44 @@ USER_ROLES = (('admin', 'Admin'),('librarian', 'Librarian'),('member', 'Member')
 # librarian can crud books, authors, borrow book themselves
 # member can view books, borrow and return books
 
+class Branch(models.Model):
+    """
+    A library branch. Books and loans belong to one branch, and librarians and
+    members assigned to a branch only see that branch's catalog and loans.
+    Users without a branch (admins) see every branch.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    code = models.SlugField(max_length=20, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def default(cls):
+        """
+        Branch of members who register or are onboarded without naming one,
+        None when the DEFAULT_BRANCH_CODE branch doesn't exist.
+        """
+        return cls.objects.filter(code=getattr(settings, 'DEFAULT_BRANCH_CODE', 'main')).first()
+
 class CustomUser(AbstractUser):
     role = models.CharField(max_length=10, choices=USER_ROLES)
     mobile_no = models.CharField(max_length=15, blank=True)
     membership_date = models.DateField(null=True, blank=True) # only for member role
     email = models.EmailField(blank=False, unique=True) # override to make required, for email activation
+    # home branch, null means all branches; indexed through user_branch_role_idx
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, null=True, blank=True, related_name='users', db_index=False)
+    loan_limit = models.PositiveSmallIntegerField(null=True, blank=True)  # overrides LOAN_LIMITS[role] for this user
+    # books currently borrowed, only written with F() updates by borrow/return and BorrowRecord edits/deletes.
+    # the API and admin save users with update_fields leaving it out; full saves elsewhere (e.g. djoser
+    # activation) can put back a stale value, `manage.py reconcile_open_loans` repairs that drift
+    open_loans = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['date_joined'], name='user_date_joined_idx'),  # admin date_hierarchy
+            models.Index(fields=['branch', 'role'], name='user_branch_role_idx'),  # librarians listing their members
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.role})"
@@ -24,6 +58,21 @@ class CustomUser(AbstractUser):
     @property
     def is_member(self):
         return self.role == 'member'
+
+    @classmethod
+    def adjust_open_loans(cls, user_id, delta):
+        # single UPDATE ... SET open_loans = open_loans + delta, never below zero
+        users = cls.objects.filter(pk=user_id)
+        if delta < 0:
+            users = users.filter(open_loans__gte=-delta)
+        return users.update(open_loans=models.F('open_loans') + delta)
+
+    @property
+    def effective_loan_limit(self):
+        # None means unlimited
+        if self.loan_limit is not None:
+            return self.loan_limit
+        return getattr(settings, 'LOAN_LIMITS', {}).get(self.role)
     
     def save(self, *args, **kwargs):
         # Clear membership_date when role is changed to admin or librarian
@@ -34,8 +83,37 @@ class CustomUser(AbstractUser):
             self.membership_date = timezone.now().date()
         super().save(*args, **kwargs)
 
+    @classmethod
+    def fields_without_counter(cls):
+        """
+        update_fields for saving an edited user without writing back a stale open_loans.
+        """
+        return [field.name for field in cls._meta.concrete_fields if not field.primary_key and field.name != 'open_loans']
+
+class PendingActivationEmail(models.Model):
+    """
+    Outbox of activation emails for bulk onboarded members, written in the
+    transaction that creates them and sent after commit by users.onboarding
+    (or `manage.py send_activation_emails`). Rows are deleted once sent.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"activation email for {self.user_id} ({self.attempts} attempts)"
+
 # utility function to handle AnonymousUser in swagger
 def get_user_role(user):
     if isinstance(user, AnonymousUser):
         return None
-    return user.role
\ No newline at end of file
+    return user.role
+
+def get_user_branch_id(user):
+    """
+    Branch the user's queries are scoped to, None for all branches.
+    """
+    if isinstance(user, AnonymousUser):
+        return None
+    return user.branch_id
@@ -0,0 +1,190 @@
+# users/onboarding.py
+# bulk member enrolment: passwords hashed across a process pool, users written with one bulk_create
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.mail import get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Branch, CustomUser, PendingActivationEmail
+
+_pool = None  # activation email sender, started on first use
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # spawned (non-forked) workers start without django configured
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _hash(password):
+    # None -> unusable password, the member sets one through password reset
+    return make_password(password)
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hash in parallel, PBKDF2 is cpu bound and single threaded per call.
+    """
+    workers = workers or getattr(settings, 'BULK_ONBOARD_WORKERS', None) or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < 2:
+        return [_hash(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(_hash, passwords, chunksize=chunksize))
+
+
+def onboard_members(rows, workers=None, send_activation=False, branch=None):
+    """
+    Create member accounts from dicts with username, email, password, mobile_no and
+    branch; rows without a branch join `branch`, or the default branch.
+    Rows whose email (after normalize_email) or username already exists, in the
+    db or earlier in `rows`, are skipped. Activation emails are only queued in the
+    PendingActivationEmail outbox. Returns {'created': [users], 'skipped': [(row, reason)],
+    'activation_queued': n}.
+    """
+    # compared the way they are stored, so case variants of the domain count as one address
+    normalized = [CustomUser.objects.normalize_email(row['email']) for row in rows]
+    usernames = {row['username'] for row in rows}
+    # one query per unique index instead of one exists() per row
+    taken_emails = set(CustomUser.objects.filter(email__in=set(normalized)).values_list('email', flat=True))
+    taken_usernames = set(CustomUser.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+    accepted = []
+    skipped = []
+    for row, email in zip(rows, normalized):
+        if email in taken_emails:
+            skipped.append((row, 'email already exists'))
+        elif row['username'] in taken_usernames:
+            skipped.append((row, 'username already exists'))
+        else:
+            taken_emails.add(email)
+            taken_usernames.add(row['username'])
+            accepted.append({**row, 'email': email})
+
+    if branch is None and any(row.get('branch') is None for row in accepted):
+        branch = Branch.default()
+    hashes = hash_passwords([row.get('password') for row in accepted], workers)
+    today = timezone.now().date()
+    is_active = not settings.DJOSER.get('SEND_ACTIVATION_EMAIL', False)
+    users = [
+        # role and membership_date set up front, CustomUser.save() is not called by bulk_create
+        CustomUser(
+            username=row['username'],
+            email=row['email'],
+            password=password,
+            mobile_no=row.get('mobile_no', ''),
+            role='member',
+            branch=row.get('branch') or branch,
+            membership_date=today,
+            is_active=is_active,
+        )
+        for row, password in zip(accepted, hashes)
+    ]
+    with transaction.atomic():
+        created = CustomUser.objects.bulk_create(users, batch_size=1000)
+        queued = send_activation and not is_active
+        if queued:
+            # the outbox rows commit with the users, sending happens after (send_in_background)
+            PendingActivationEmail.objects.bulk_create([PendingActivationEmail(user=user) for user in created], batch_size=1000)
+    return {'created': created, 'skipped': skipped, 'activation_queued': len(created) if queued else 0}
+
+
+def _link_context(request):
+    # the activation link points at the host the admin onboarded from, like djoser's own emails
+    if request is None:
+        return {}
+    site = get_current_site(request)
+    return {
+        'domain': getattr(settings, 'DOMAIN', '') or site.domain,
+        'protocol': 'https' if request.is_secure() else 'http',
+        'site_name': getattr(settings, 'SITE_NAME', '') or site.name,
+    }
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=getattr(settings, 'ACTIVATION_EMAIL_WORKERS', 1))
+        return _pool
+
+
+def _send(user_ids, context):
+    # runs on an executor thread, which gets its own db connection
+    try:
+        send_activation_emails(user_ids, context)
+    finally:
+        connection.close()
+
+
+def send_in_background(user_ids, request=None):
+    """
+    Send the users' queued activation emails off the request, once the current
+    transaction commits. With ACTIVATION_EMAIL_WORKERS = 0 they wait in the
+    outbox for `manage.py send_activation_emails`.
+    """
+    if not getattr(settings, 'ACTIVATION_EMAIL_WORKERS', 1):
+        return
+    context = _link_context(request)
+    transaction.on_commit(lambda: _executor().submit(_send, user_ids, context))
+
+
+def send_activation_emails(user_ids=None, context=None, batch_size=None):
+    """
+    Send queued djoser activation emails, all of them or only those of `user_ids`,
+    reusing one SMTP connection per batch. Sent rows leave the outbox; a failed
+    send or connection is recorded on its rows for a later run to retry, until
+    ACTIVATION_EMAIL_MAX_ATTEMPTS. Returns {'sent': n, 'unsent': [emails]}.
+    """
+    from djoser.conf import settings as djoser_settings
+
+    batch_size = batch_size or getattr(settings, 'BULK_ONBOARD_EMAIL_BATCH', 50)
+    pending = PendingActivationEmail.objects.filter(attempts__lt=getattr(settings, 'ACTIVATION_EMAIL_MAX_ATTEMPTS', 5))
+    if user_ids is not None:
+        pending = pending.filter(user_id__in=user_ids)
+    sent = 0
+    unsent = []
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            # locked while sending, so a concurrent run skips these rows instead of sending twice
+            batch = list(
+                pending.filter(id__gt=last_id).select_related('user').select_for_update(skip_locked=True, of=('self',))
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            delivered = []
+            failed = []
+            try:
+                with get_connection() as smtp:
+                    for row in batch:
+                        message = djoser_settings.EMAIL.activation(None, {'user': row.user, **(context or {})})
+                        message.connection = smtp
+                        try:
+                            message.send([row.user.email])
+                        except Exception as e:
+                            failed.append((row, e))
+                        else:
+                            delivered.append(row.pk)
+            except Exception as e:  # connecting or closing failed, the rest of the batch is unsent
+                done = set(delivered) | {row.pk for row, _ in failed}
+                failed.extend((row, e) for row in batch if row.pk not in done)
+            PendingActivationEmail.objects.filter(pk__in=delivered).delete()
+            for row, error in failed:
+                row.attempts += 1
+                row.last_error = f'{type(error).__name__}: {error}'
+                row.save(update_fields=['attempts', 'last_error'])
+        sent += len(delivered)
+        unsent.extend(row.user.email for row, _ in failed)
+    return {'sent': sent, 'unsent': unsent}
@@ -3,27 +3,40 @@ from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
 from django.contrib.auth.models import AnonymousUser
-from .models import CustomUser, get_user_role
+from .models import Branch, CustomUser, get_user_role
 from django.conf import settings
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CounterSafeUpdateMixin:
+    """
+    Saves only the submitted fields (plus membership_date, which follows the role),
+    so an update never writes back a stale open_loans.
+    """
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'membership_date'])
+        return instance
+
+class CustomUserSerializer(CounterSafeUpdateMixin, serializers.ModelSerializer):
     """
     Serializer for the CustomUser model.
     """
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'email', 'role', 'mobile_no', 'membership_date', 'is_active']
-        read_only_fields = ['id', 'membership_date']
+        fields = ['id', 'username', 'email', 'role', 'branch', 'mobile_no', 'membership_date', 'loan_limit', 'open_loans', 'is_active']
+        read_only_fields = ['id', 'membership_date', 'branch', 'loan_limit', 'open_loans']
     
     def get_fields(self):
         fields = super().get_fields()
         request = self.context.get('request')
         
-        # Allow admins to edit the role field
+        # Allow admins to edit the role, branch and loan limit fields
         if request and hasattr(request, 'user') and not isinstance(request.user, AnonymousUser):
             user_role = get_user_role(request.user)
             if user_role in ['admin']:
                 fields['role'].read_only = False
+                fields['branch'].read_only = False
+                fields['loan_limit'].read_only = False
         
         return fields
 
@@ -43,28 +56,68 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = CustomUser
-        fields = ['username', 'email', 'password', 'mobile_no']
+        fields = ['username', 'email', 'password', 'mobile_no', 'branch']
         extra_kwargs = {
             'username': {'required': True},
             'email': {'required': True},
+            'branch': {'allow_null': False, 'help_text': "Home branch id, the default branch when left out."},
         }
     
     def validate_email(self, value):
         if CustomUser.objects.filter(email=value).exists():
             raise serializers.ValidationError("A user with this email already exists.")
         return value
+
+    def validate(self, attrs):
+        # a member without a branch would be unscoped, and invisible to branch librarians
+        if attrs.get('branch') is None:
+            attrs['branch'] = Branch.default()
+            if attrs['branch'] is None:
+                raise serializers.ValidationError({'branch': "This field is required."})
+        return attrs
     
     def create(self, validated_data):
         # Set is_active=False if email activation is enabled
+        # role passed to create_user, so the user is written with a single INSERT
         if settings.DJOSER.get('SEND_ACTIVATION_EMAIL', False):
-            user = CustomUser.objects.create_user(is_active=False, **validated_data)
+            user = CustomUser.objects.create_user(is_active=False, role='member', **validated_data)
         else:
-            user = CustomUser.objects.create_user(**validated_data)
-        
-        user.role = 'member'
-        user.save()
+            user = CustomUser.objects.create_user(role='member', **validated_data)
         return user
 
+class OnboardMemberSerializer(serializers.Serializer):
+    """
+    One row of a bulk onboarding request.
+    """
+    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField()
+    password = serializers.CharField(write_only=True, required=False, validators=[validate_password])
+    mobile_no = serializers.CharField(max_length=15, required=False, allow_blank=True)
+    branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all(), required=False)
+
+
+class BulkOnboardSerializer(serializers.Serializer):
+    """
+    Serializer for bulk member onboarding.
+    Rows without a branch get `branch`, or the default branch when that is left out too.
+    """
+    members = OnboardMemberSerializer(many=True, allow_empty=False)
+    branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all(), required=False)
+    send_activation = serializers.BooleanField(default=False)
+
+    def validate_members(self, value):
+        limit = getattr(settings, 'BULK_ONBOARD_LIMIT', 5000)
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} members can be onboarded at once.")
+        return value
+
+    def validate(self, attrs):
+        if attrs.get('branch') is None and any(row.get('branch') is None for row in attrs['members']):
+            attrs['branch'] = Branch.default()
+            if attrs['branch'] is None:
+                raise serializers.ValidationError({'branch': "Required for rows without a branch, there is no default branch."})
+        return attrs
+
 class UserLoginSerializer(serializers.Serializer):
     """
     Serializer for user login.
@@ -72,7 +125,7 @@ class UserLoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
 
-class UserRoleUpdateSerializer(serializers.ModelSerializer):
+class UserRoleUpdateSerializer(CounterSafeUpdateMixin, serializers.ModelSerializer):
     """
     Serializer for updating user role.
     """
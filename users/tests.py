@@ -1,3 +1,187 @@
-from django.test import TestCase
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from library.models import Author, Book
+from .models import Branch, CustomUser, PendingActivationEmail
+from .onboarding import onboard_members, send_activation_emails
+from .throttling import RoleScopedThrottle, parse_rate
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        branch = Branch.objects.create(name='Central', code='central')
+        author = Author.objects.create(name='Author', biography='-')
+        self.books = [
+            Book.objects.create(title=f'Book {i}', author=author, ISBN=isbn, category='C', branch=branch)
+            for i, isbn in enumerate(['9780306406157', '9780451524935', '9780747532699'])
+        ]
+        self.member = CustomUser.objects.create(username='member', email='member@example.com', role='member', branch=branch)
+        self.librarian = CustomUser.objects.create(username='librarian', email='librarian@example.com', role='librarian', branch=branch)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('30/min'), (30, 60))
+        self.assertEqual(parse_rate('5/hour'), (5, 3600))
+
+    @throttle_rates(borrow='2/min')
+    def test_borrow_429_with_retry_after(self):
+        self.client.force_authenticate(self.member)
+        with mock.patch('users.throttling.time.time', return_value=6000 + 30):
+            for book in self.books[:2]:
+                self.assertEqual(self.client.post('/library/borrow/', {'book': book.pk}).status_code, 201)
+            response = self.client.post('/library/borrow/', {'book': self.books[2].pk})
+        self.assertEqual(response.status_code, 429)
+        # 30s to the next window, then half a window for the weighted previous one to drain
+        self.assertEqual(response['Retry-After'], '60')
+
+    @throttle_rates(catalog='2/min', catalog_librarian='5/min')
+    def test_role_rates(self):
+        with mock.patch('users.throttling.time.time', return_value=6000):
+            self.client.force_authenticate(self.member)
+            self.assertEqual([self.client.get('/books/').status_code for _ in range(3)], [200, 200, 429])
+            self.client.force_authenticate(self.librarian)
+            self.assertEqual([self.client.get('/books/').status_code for _ in range(3)], [200, 200, 200])
+
+    def test_rejected_requests_are_not_counted(self):
+        throttle = RoleScopedThrottle()
+        throttle.rates = {'catalog': '3/min'}
+        view = mock.Mock(throttle_scope='catalog')
+        request = mock.Mock(user=self.member)
+        with mock.patch('users.throttling.time.time', return_value=6000 + 30):
+            self.assertEqual([throttle.allow_request(request, view) for _ in range(10)], [True] * 3 + [False] * 7)
+        # the 7 rejected retries don't push the block further: 3 * 40/60 + 1 fits at 20s into the next window
+        with mock.patch('users.throttling.time.time', return_value=6000 + 60 + 20):
+            self.assertTrue(throttle.allow_request(request, view))
+
+
+@override_settings(BULK_ONBOARD_WORKERS=1, ACTIVATION_EMAIL_WORKERS=1)
+class BulkOnboardTests(APITestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create(username='admin', email='admin@example.com', role='admin')
+        CustomUser.objects.create(username='existing', email='old@example.com', role='member')
+        self.client.force_authenticate(self.admin)
+
+    def test_case_variant_emails_are_skipped(self):
+        response = self.client.post('/users/bulk-onboard/', {'members': [
+            {'username': 'new1', 'email': 'new@EXAMPLE.com', 'password': 'Correct-Horse-42'},
+            {'username': 'new2', 'email': 'new@example.com', 'password': 'Correct-Horse-42'},
+            {'username': 'new3', 'email': 'old@Example.COM'},
+            {'username': 'existing', 'email': 'fresh@example.com'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([user['email'] for user in response.data['created']], ['new@example.com'])
+        self.assertEqual(
+            [(row['username'], row['reason']) for row in response.data['skipped']],
+            [('new2', 'email already exists'), ('new3', 'email already exists'), ('existing', 'username already exists')],
+        )
+        user = CustomUser.objects.get(username='new1')
+        self.assertEqual(user.role, 'member')
+        self.assertTrue(check_password('Correct-Horse-42', user.password))
+
+    def test_activation_emails_are_sent_after_the_response(self):
+        rows = [{'username': f'new{i}', 'email': f'new{i}@example.com'} for i in range(3)]
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/users/bulk-onboard/', {'members': rows, 'send_activation': True}, format='json')
+        self.assertEqual(response.data['activation_queued'], 3)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(PendingActivationEmail.objects.count(), 3)
+
+        self.assertEqual(send_activation_emails(batch_size=2), {'sent': 3, 'unsent': []})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['new0@example.com', 'new1@example.com', 'new2@example.com'])
+        self.assertFalse(PendingActivationEmail.objects.exists())
+
+    def test_failed_sends_stay_queued(self):
+        onboard_members([{'username': f'new{i}', 'email': f'new{i}@example.com'} for i in range(2)], send_activation=True)
+        send = EmailMessage.send
+
+        def flaky(message, *args, **kwargs):
+            if message.to == ['new0@example.com']:
+                raise SMTPException('mailbox unavailable')
+            return send(message, *args, **kwargs)
+
+        with mock.patch.object(EmailMessage, 'send', flaky):
+            self.assertEqual(send_activation_emails(), {'sent': 1, 'unsent': ['new0@example.com']})
+        row = PendingActivationEmail.objects.get()
+        self.assertEqual((row.user.username, row.attempts), ('new0', 1))
+        self.assertIn('mailbox unavailable', row.last_error)
+        with override_settings(ACTIVATION_EMAIL_MAX_ATTEMPTS=1):
+            self.assertEqual(send_activation_emails(), {'sent': 0, 'unsent': []})
+        self.assertEqual(send_activation_emails(), {'sent': 1, 'unsent': []})
+
+    def test_admin_only(self):
+        self.client.force_authenticate(CustomUser.objects.get(username='existing'))
+        response = self.client.post('/users/bulk-onboard/', {'members': [{'username': 'x', 'email': 'x@example.com'}]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class MemberBranchTests(APITestCase):
+    def setUp(self):
+        cache.clear()  # throttle counters
+        self.main = Branch.objects.get(code='main')  # users migration 0004
+        self.harbour = Branch.objects.create(name='Harbour', code='harbour')
+        self.admin = CustomUser.objects.create(username='admin', email='admin@example.com', role='admin', is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def register(self, **extra):
+        self.client.force_authenticate(None)
+        return self.client.post('/auth/users/', {'username': 'reader', 'email': 'reader@example.com', 'password': 'Correct-Horse-42', **extra})
+
+    def test_registration_defaults_to_the_main_branch(self):
+        self.assertEqual(self.register().status_code, 201)
+        self.assertEqual(CustomUser.objects.get(username='reader').branch, self.main)
+
+    def test_registration_with_a_branch(self):
+        self.assertEqual(self.register(branch=self.harbour.pk).status_code, 201)
+        self.assertEqual(CustomUser.objects.get(username='reader').branch, self.harbour)
+        self.assertEqual(self.register(branch=999).status_code, 400)
+
+    @override_settings(DEFAULT_BRANCH_CODE='missing')
+    def test_branch_required_without_a_default(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('branch', response.data)
+        self.client.force_authenticate(self.admin)
+        response = self.client.post('/users/bulk-onboard/', {'members': [{'username': 'a', 'email': 'a@example.com'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(BULK_ONBOARD_WORKERS=1)
+    def test_bulk_onboard_branches(self):
+        rows = [
+            {'username': 'a', 'email': 'a@example.com'},
+            {'username': 'b', 'email': 'b@example.com', 'branch': self.main.pk},
+        ]
+        response = self.client.post('/users/bulk-onboard/', {'members': rows, 'branch': self.harbour.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([user['branch'] for user in response.data['created']], [self.harbour.pk, self.main.pk])
+        response = self.client.post('/users/bulk-onboard/', {'members': [{'username': 'c', 'email': 'c@example.com'}]}, format='json')
+        self.assertEqual(response.data['created'][0]['branch'], self.main.pk)
+
+
+class CustomUserSaveTests(TestCase):
+    def test_save_keeps_caller_arguments(self):
+        user = CustomUser.objects.create(username='member', email='member@example.com', role='member')
+        CustomUser.adjust_open_loans(user.pk, 2)
+        user.mobile_no = '555'
+        user.save(update_fields=['mobile_no'])
+        self.assertEqual(CustomUser.objects.get(pk=user.pk).open_loans, 2)
+
+        # saving an instance whose row is gone inserts it again
+        CustomUser.objects.filter(pk=user.pk).delete()
+        user.save()
+        self.assertTrue(CustomUser.objects.filter(pk=user.pk).exists())
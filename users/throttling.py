@@ -0,0 +1,121 @@
+# users/throttling.py
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .models import get_user_role
+
+# third-party views we can't annotate with throttle_scope, keyed by "module.Class" or "module.Class.action"
+VIEW_THROTTLE_SCOPES = {
+    'rest_framework_simplejwt.views.TokenObtainPairView': 'auth',  # /api/token/ and /auth/jwt/create/
+    'djoser.views.TokenCreateView': 'auth',  # /auth/token/login/
+    'djoser.views.UserViewSet.create': 'register',  # /auth/users/ registration
+}
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    '100/min' -> (100, 60), same format as DRF's DEFAULT_THROTTLE_RATES.
+    """
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+class RoleScopedThrottle(BaseThrottle):
+    """
+    Scoped rate limiting with role aware quotas.
+    - The scope comes from `view.throttle_scope`, the `scope` class attribute or VIEW_THROTTLE_SCOPES.
+    - Rates are read from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']; a '<scope>_<role>' entry
+      overrides '<scope>' for that role, e.g. 'catalog_librarian'.
+    - Authenticated users are limited per user, anonymous clients per IP.
+    - Counts live in the THROTTLE_CACHE cache and only use atomic add/incr/decr, so concurrent
+      workers sharing a redis/memcached cache never lose updates. The previous window is
+      weighted in (sliding window counter) so bursts at a window edge are still smoothed.
+    - Rejected requests are not counted, like DRF's SimpleRateThrottle.
+    Views without a scope or without a configured rate are not throttled.
+    """
+    scope = None
+    cache_format = 'throttle_%(scope)s_%(ident)s_%(window)s'
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+        self.rates = settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})
+        self.wait_seconds = None
+
+    def get_scope(self, view):
+        scope = self.scope or getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+        view_path = f'{view.__class__.__module__}.{view.__class__.__name__}'
+        action = getattr(view, 'action', None)
+        return VIEW_THROTTLE_SCOPES.get(f'{view_path}.{action}') or VIEW_THROTTLE_SCOPES.get(view_path)
+
+    def get_rate(self, scope, role):
+        if role and f'{scope}_{role}' in self.rates:
+            return self.rates[f'{scope}_{role}']
+        return self.rates.get(scope)
+
+    def get_cache_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user_{request.user.pk}'
+        return f'ip_{self.get_ident(request)}'
+
+    def _incr(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:  # evicted between add() and incr()
+            self.cache.set(key, 1, timeout)
+            return 1
+
+    def _decr(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:  # evicted, nothing left to undo
+            pass
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        if scope is None:
+            return True
+        rate = self.get_rate(scope, get_user_role(request.user))
+        if rate is None:
+            return True
+        num_requests, duration = parse_rate(rate)
+
+        now = time.time()
+        window = int(now // duration)
+        elapsed = now - window * duration
+        ident = self.get_cache_ident(request)
+        key = self.cache_format % {'scope': scope, 'ident': ident, 'window': window}
+        previous_key = self.cache_format % {'scope': scope, 'ident': ident, 'window': window - 1}
+
+        count = self._incr(key, duration * 2)
+        previous = self.cache.get(previous_key, 0)
+        remaining = (duration - elapsed) / duration
+        if previous * remaining + count <= num_requests:
+            return True
+
+        # only allowed requests are counted, so clients retrying while blocked don't extend the block
+        self._decr(key)
+        allowed = count - 1
+        if allowed < num_requests and previous:
+            # until the weighted previous window has drained enough for one more request
+            self.wait_seconds = duration - elapsed - (num_requests - allowed - 1) * duration / previous
+        elif allowed:
+            # until the next window, once this window's weight has drained enough
+            self.wait_seconds = duration - elapsed + max(duration * (1 - (num_requests - 1) / allowed), 0)
+        else:
+            self.wait_seconds = duration - elapsed
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class BorrowRateThrottle(RoleScopedThrottle):
+    scope = 'borrow'
@@ -4,8 +4,11 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import AllowAny, IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from django.contrib.auth import authenticate, login, logout
-from .models import CustomUser, get_user_role
-from .serializers import CustomUserSerializer, UserRegistrationSerializer, UserLoginSerializer,UserRoleUpdateSerializer
+from .models import CustomUser, get_user_role, get_user_branch_id
+from .serializers import CustomUserSerializer, UserRegistrationSerializer, UserLoginSerializer,UserRoleUpdateSerializer, BulkOnboardSerializer
+from .onboarding import onboard_members, send_in_background
+from library_management.docs import swagger_auto_schema
+from library.query_budget import QueryBudget
 from .permissions import IsLibrarian, IsAdminUser
 
 
@@ -19,6 +22,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [IsAuthenticated]
+    query_budgets = {'list': QueryBudget(2, ms=200, role='admin'), 'retrieve': QueryBudget(1, ms=100, role='admin')}
     
     def get_queryset(self):
         user = self.request.user
@@ -27,7 +31,11 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         if user_role == 'admin':
             return CustomUser.objects.all()
         elif user_role == 'librarian':
-            return CustomUser.objects.filter(role='member')
+            members = CustomUser.objects.filter(role='member')
+            branch_id = get_user_branch_id(user)
+            if branch_id is not None:
+                members = members.filter(branch_id=branch_id)  # user_branch_role_idx
+            return members
         return CustomUser.objects.filter(id=user.id)
     
     def get_permissions(self):
@@ -55,3 +63,32 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(method='post', request_body=BulkOnboardSerializer)
+    @action(detail=False, methods=['post'], url_path='bulk-onboard', permission_classes=[IsAdminUser])
+    def bulk_onboard(self, request):
+        """
+        Enrol many members at once.
+        - Only admins can onboard members.
+        - Passwords are hashed across a process pool and users are written with one bulk insert.
+        - Rows whose email or username already exists are skipped and reported.
+        - Members join the row's `branch`, else the request's `branch`, else the default branch.
+        - Activation emails are queued and sent after the response, emails that keep failing
+          are listed by `manage.py send_activation_emails`.
+        """
+        serializer = BulkOnboardSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        result = onboard_members(
+            serializer.validated_data['members'],
+            send_activation=serializer.validated_data['send_activation'],
+            branch=serializer.validated_data.get('branch'),
+        )
+        if result['activation_queued']:
+            send_in_background([user.pk for user in result['created']], request)
+        return Response({
+            'created': CustomUserSerializer(result['created'], many=True).data,
+            'skipped': [{'username': row['username'], 'email': row['email'], 'reason': reason} for row, reason in result['skipped']],
+            'activation_queued': result['activation_queued'],
+        }, status=status.HTTP_201_CREATED)